@@ -0,0 +1,64 @@
+from __future__ import print_function
+
+import dynet_config
+dynet_config.set(mem=1024, random_seed=12345)
+
+import dynet as dy
+import numpy as np
+from argparse import ArgumentParser
+from collections import OrderedDict
+from benchmark import measure, with_throughput, print_result, save_results
+from layers import BiLSTM, FusedBiLSTM
+
+def bench_lstm(name, lstm, length, args, rng, results):
+    values = [rng.randn(args.input_dim).tolist() for _ in range(length)]
+
+    def _build():
+        dy.renew_cg()
+        x = [dy.inputVector(v) for v in values]
+        if isinstance(lstm, FusedBiLSTM):
+            return dy.sum_elems(lstm.matrix(x))
+        return dy.esum([dy.sum_elems(h) for h in lstm(x)])
+
+    def _forward():
+        _build().value()
+
+    def _backward():
+        loss = _build()
+        loss.value()
+        loss.backward()
+
+    for phase, fn in [("build", _build), ("forward", _forward), ("forward_backward", _backward)]:
+        stats = measure(fn, repeat=args.repeat, number=args.number)
+        key = "{0}.{1}[{2}]".format(name, phase, length)
+        results[key] = with_throughput(stats, length, "tokens")
+        print_result(key, stats)
+
+def _parse_args():
+    parser = ArgumentParser()
+
+    parser.add_argument("--lengths", default=[10, 25, 50, 100], type=int, nargs='+')
+    parser.add_argument("--input_dim", default=125, type=int)
+    parser.add_argument("--lstm_dim", default=250, type=int)
+    parser.add_argument("--num_layers", default=2, type=int)
+    parser.add_argument("--repeat", default=5, type=int)
+    parser.add_argument("--number", default=10, type=int)
+    parser.add_argument("--seed", default=1, type=int)
+    parser.add_argument("--output", default="bench_bilstm.json")
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = _parse_args()
+    rng = np.random.RandomState(args.seed)
+
+    pc = dy.ParameterCollection()
+    lstms = OrderedDict([("BiLSTM", BiLSTM(pc, args.input_dim, args.lstm_dim, args.num_layers)),
+                         ("FusedBiLSTM", FusedBiLSTM(pc, args.input_dim, args.lstm_dim, args.num_layers))])
+
+    results = OrderedDict()
+    for length in args.lengths:
+        for name, lstm in lstms.items():
+            bench_lstm(name, lstm, length, args, rng, results)
+    save_results(args.output, results)
+    print("results saved to {0}".format(args.output))
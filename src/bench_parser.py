@@ -0,0 +1,137 @@
+from __future__ import print_function
+
+import time
+_START = time.time()
+
+import glob
+import os
+import random
+import resource
+import sys
+from argparse import ArgumentParser
+from collections import OrderedDict
+from dl4dp import arc_loss, label_loss, shuffled_stream
+import dynet as dy
+from benchmark import load_results, save_results
+from models import MLPParser, FIELDS
+from utils import map_to_instances, read_conllu, read_index
+
+_THROUGHPUT_METRICS = ("train_tokens_per_sec", "parse_tokens_per_sec")
+
+def _peak_rss_mb():
+    # ru_maxrss je na Linuxe v kB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+def bench_train(model, trainer, train_data, num_steps, batch_size):
+    model.enable_dropout()
+    num_tokens = 0
+    batch_loss = []
+    batch_tokens = 0
+    step = 0
+
+    start = time.time()
+    dy.renew_cg()
+    for tree in shuffled_stream(train_data):
+        batch_loss.append(arc_loss(model, tree))
+        batch_loss.append(label_loss(model, tree))
+        batch_tokens += len(tree)
+        if batch_tokens >= batch_size:
+            loss = dy.esum(batch_loss) * (1.0 / batch_tokens)
+            loss.value()
+            loss.backward()
+            trainer.update()
+            dy.renew_cg()
+            num_tokens += batch_tokens
+            batch_loss = []
+            batch_tokens = 0
+            step += 1
+            if step >= num_steps:
+                break
+    return num_tokens, time.time() - start
+
+def bench_parse(model, test_data):
+    model.disable_dropout()
+    num_tokens = 0
+    first_parse = None
+    start = time.time()
+    for tree in test_data:
+        model.parse(tree.feats)
+        num_tokens += len(tree)
+        if first_parse is None:
+            first_parse = time.time() - _START
+    return num_tokens, time.time() - start, first_parse
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for metric in _THROUGHPUT_METRICS:
+        if metric not in baseline:
+            continue
+        change = results[metric] / baseline[metric] - 1.
+        print("{0:<24} {1:12.1f} (baseline {2:12.1f}, {3:+.1%})".format(metric, results[metric], baseline[metric], change))
+        if change < -threshold:
+            regressions.append(metric)
+    return regressions
+
+def _parse_args():
+    parser = ArgumentParser()
+
+    parser.add_argument("--basename", default="../build/en")
+    parser.add_argument("--train", default="../treebanks/train/en/en.conllu")
+    parser.add_argument("--test", nargs='+')
+    parser.add_argument("--steps", default=200, type=int)
+    parser.add_argument("--batch_size", default=50, type=int)
+    parser.add_argument("--seed", default=1, type=int)
+    parser.add_argument("--output", default="bench_parser.json")
+    parser.add_argument("--baseline", default="bench_parser_baseline.json")
+    parser.add_argument("--save_baseline", action="store_true")
+    parser.add_argument("--threshold", default=0.1, type=float)
+
+    args = parser.parse_args()
+    if not args.test:
+        args.test = sorted(f for lang in ("en", "cs", "sk") for f in glob.glob("../treebanks/test/{0}/*.conllu".format(lang))
+                           if "-" not in os.path.basename(f))
+    return args
+
+if __name__ == "__main__":
+    args = _parse_args()
+    random.seed(args.seed)
+
+    index = read_index(args.basename)
+    pc = dy.ParameterCollection()
+    model = MLPParser(pc, basename=args.basename)
+    trainer = dy.AdamTrainer(pc)
+
+    # prva veta sa parsuje hned po nacitani modelu, ostatne testovacie data sa citaju az potom
+    first = list(map_to_instances(read_conllu(args.test[0], max_sentences=1), index, FIELDS))
+    _, _, first_parse = bench_parse(model, first)
+
+    test_data = [tree for filename in args.test for tree in map_to_instances(read_conllu(filename), index, FIELDS)]
+
+    train_data = list(map_to_instances(read_conllu(args.train), index, FIELDS))
+    train_tokens, train_time = bench_train(model, trainer, train_data, args.steps, args.batch_size)
+    parse_tokens, parse_time, _ = bench_parse(model, test_data)
+
+    results = OrderedDict()
+    results["train_steps"] = args.steps
+    results["train_tokens"] = train_tokens
+    results["train_tokens_per_sec"] = train_tokens / train_time
+    results["parse_tokens"] = parse_tokens
+    results["parse_tokens_per_sec"] = parse_tokens / parse_time
+    results["time_to_first_parse"] = first_parse
+    results["peak_rss_mb"] = _peak_rss_mb()
+
+    for k, v in results.items():
+        print("{0:<24} {1}".format(k, v))
+
+    save_results(args.output, results)
+
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print("baseline saved to {0}".format(args.baseline))
+    elif os.path.exists(args.baseline):
+        regressions = compare(results, load_results(args.baseline)["results"], args.threshold)
+        if regressions:
+            print("throughput regression (> {0:.0%}): {1}".format(args.threshold, ", ".join(regressions)))
+            sys.exit(1)
+    else:
+        print("no baseline found at {0}".format(args.baseline))
@@ -0,0 +1,136 @@
+from __future__ import print_function
+
+import gc
+import glob
+import os
+import tracemalloc
+import numpy as np
+from argparse import ArgumentParser
+from collections import OrderedDict
+from benchmark import measure, with_throughput, print_result, save_results
+from utils import FORM, UPOS, FEATS, DEPREL
+from utils import read_conllu, read_conllu_compact, create_dictionary, create_index, map_to_instances
+from utils import map_to_instance, map_to_packed
+from utils import parse_projective, parse_nonprojective, is_projective
+
+def _random_scores(length, rng):
+    return rng.randn(length + 1, length + 1)
+
+def bench_decoders(args, results):
+    rng = np.random.RandomState(args.seed)
+    for length in args.lengths:
+        scores = _random_scores(length, rng)
+        for name, fn in [("parse_projective", parse_projective), ("parse_nonprojective", parse_nonprojective)]:
+            stats = measure(lambda: fn(scores), repeat=args.repeat)
+            key = "{0}[{1}]".format(name, length)
+            results[key] = with_throughput(stats, length, "tokens")
+            print_result(key, stats)
+
+        heads = parse_projective(scores) - 1
+        stats = measure(lambda: is_projective(heads), repeat=args.repeat)
+        key = "is_projective[{0}]".format(length)
+        results[key] = with_throughput(stats, length, "tokens")
+        print_result(key, stats)
+
+def check_float32(args, results):
+    rng = np.random.RandomState(args.seed)
+    mismatches = OrderedDict([("parse_projective", 0), ("parse_nonprojective", 0)])
+    num_checks = 0
+    for length in args.lengths:
+        for _ in range(args.repeat):
+            scores = _random_scores(length, rng)
+            scores32 = scores.astype(np.float32)
+            if not np.array_equal(parse_projective(scores, dtype=np.float64), parse_projective(scores32)):
+                mismatches["parse_projective"] += 1
+            if not np.array_equal(parse_nonprojective(scores), parse_nonprojective(scores32)):
+                mismatches["parse_nonprojective"] += 1
+            num_checks += 1
+    for name, count in mismatches.items():
+        print("{0:<40} {1} of {2} trees differ between float64 and float32".format(name + "[float32]", count, num_checks))
+    results["float32"] = OrderedDict([("checks", num_checks), ("mismatches", mismatches)])
+
+def bench_reader(args, results):
+    fields = (FORM, UPOS, FEATS)
+    for filename in args.treebanks:
+        name = os.path.relpath(filename, args.treebank_dir)
+        sentences = list(read_conllu(filename))
+        num_tokens = sum(len(sentence) for sentence in sentences)
+
+        stats = measure(lambda: list(read_conllu(filename)), repeat=args.repeat)
+        key = "read_conllu[{0}]".format(name)
+        results[key] = with_throughput(stats, num_tokens, "tokens")
+        print_result(key, stats)
+
+        stats = measure(lambda: create_index(create_dictionary(sentences)), repeat=args.repeat)
+        key = "create_index[{0}]".format(name)
+        results[key] = with_throughput(stats, num_tokens, "tokens")
+        print_result(key, stats)
+
+        index = create_index(create_dictionary(sentences, fields=set(fields) | {DEPREL}))
+        stats = measure(lambda: [map_to_instance(sentence, index, fields) for sentence in sentences], repeat=args.repeat)
+        key = "map_to_instance[{0}]".format(name)
+        results[key] = with_throughput(stats, num_tokens, "tokens")
+        print_result(key, stats)
+
+        stats = measure(lambda: list(map_to_instances(sentences, index, fields)), repeat=args.repeat)
+        key = "map_to_instances[{0}]".format(name)
+        results[key] = with_throughput(stats, num_tokens, "tokens")
+        print_result(key, stats)
+
+        stats = measure(lambda: map_to_packed(sentences, index, fields), repeat=args.repeat)
+        key = "map_to_packed[{0}]".format(name)
+        results[key] = with_throughput(stats, num_tokens, "tokens")
+        print_result(key, stats)
+
+def _traced_size(load):
+    gc.collect()
+    tracemalloc.start()
+    data = load()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, size
+
+def bench_memory(args, results):
+    for filename in args.memory_treebanks:
+        name = os.path.relpath(filename, args.treebank_dir)
+        sentences, list_size = _traced_size(lambda: list(read_conllu(filename)))
+        num_tokens = sum(len(sentence) for sentence in sentences)
+        del sentences
+        compact, compact_size = _traced_size(lambda: list(read_conllu_compact(filename)))
+        del compact
+
+        key = "memory[{0}]".format(name)
+        results[key] = OrderedDict([("tokens", num_tokens), ("list_bytes", list_size), ("compact_bytes", compact_size),
+                                    ("list_bytes_per_token", float(list_size) / num_tokens),
+                                    ("compact_bytes_per_token", float(compact_size) / num_tokens)])
+        print("{0:<40} list {1:8.1f} B/token  compact {2:8.1f} B/token  ({3:.1f}x)".format(key,
+            float(list_size) / num_tokens, float(compact_size) / num_tokens, float(list_size) / compact_size))
+
+def _parse_args():
+    parser = ArgumentParser()
+
+    parser.add_argument("--suite", default=["decoders", "reader"], nargs='+')
+    parser.add_argument("--lengths", default=[10, 25, 50, 100, 150], type=int, nargs='+')
+    parser.add_argument("--treebank_dir", default="../treebanks")
+    parser.add_argument("--treebanks", nargs='+')
+    parser.add_argument("--memory_treebanks", default=["../treebanks/train/cs/cs_cac.conllu"], nargs='+')
+    parser.add_argument("--repeat", default=5, type=int)
+    parser.add_argument("--seed", default=1, type=int)
+    parser.add_argument("--output", default="bench_utils.json")
+
+    args = parser.parse_args()
+    if not args.treebanks:
+        # iba zlate (nie automaticky anotovane -udpipe/-pmor) treebanky
+        args.treebanks = sorted(f for f in glob.glob(os.path.join(args.treebank_dir, "*", "*", "*.conllu"))
+                                if "-" not in os.path.basename(f))
+    return args
+
+_SUITES = OrderedDict([("decoders", bench_decoders), ("reader", bench_reader), ("memory", bench_memory), ("float32", check_float32)])
+
+if __name__ == "__main__":
+    args = _parse_args()
+    results = OrderedDict()
+    for suite in args.suite:
+        _SUITES[suite](args, results)
+    save_results(args.output, results)
+    print("results saved to {0}".format(args.output))
@@ -0,0 +1,49 @@
+from __future__ import print_function
+
+import json
+import math
+import platform
+import sys
+import time
+from collections import OrderedDict
+
+''' Spusti 'fn' opakovane a vrati statistiku casov jedneho volania '''
+def measure(fn, repeat=5, number=1, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        for _ in range(number):
+            fn()
+        times.append((time.time() - start) / number)
+    times.sort()
+    mean = sum(times) / len(times)
+    stdev = math.sqrt(sum((t - mean) ** 2 for t in times) / max(len(times) - 1, 1))
+    median = times[len(times) // 2] if len(times) % 2 else (times[len(times) // 2 - 1] + times[len(times) // 2]) / 2
+    return OrderedDict([("min", times[0]), ("median", median), ("mean", mean), ("stdev", stdev), ("repeat", repeat), ("number", number)])
+
+''' Prida k statistike priepustnost 'units' jednotiek za sekundu (podla mediana) '''
+def with_throughput(stats, units, unit_name):
+    stats["units"] = units
+    stats["unit"] = unit_name
+    stats["throughput"] = units / stats["median"] if stats["median"] > 0 else float("inf")
+    return stats
+
+def print_result(name, stats, file=sys.stdout):
+    line = "{0:<40} median {1:10.6f}s  min {2:10.6f}s  stdev {3:9.6f}s".format(name, stats["median"], stats["min"], stats["stdev"])
+    if "throughput" in stats:
+        line += "  {0:12.1f} {1}/s".format(stats["throughput"], stats["unit"])
+    print(line, file=file)
+    file.flush()
+
+def environment():
+    return OrderedDict([("python", platform.python_version()), ("platform", platform.platform()), ("time", time.strftime("%Y-%m-%dT%H:%M:%S"))])
+
+def save_results(filename, results):
+    with open(filename, "w") as fp:
+        json.dump(OrderedDict([("environment", environment()), ("results", results)]), fp, indent=2)
+
+def load_results(filename):
+    with open(filename, "r") as fp:
+        return json.load(fp, object_pairs_hook=OrderedDict)
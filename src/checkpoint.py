@@ -0,0 +1,133 @@
+from __future__ import print_function
+
+import os
+import threading
+import time
+import numpy as np
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+CHECKPOINT_FILENAME = "checkpoint_{0:08d}.npz"
+
+''' Skopiruje hodnoty vsetkych parametrov kolekcie 'pc' do NumPy poli '''
+def snapshot(pc):
+    arrays = {}
+    for i, p in enumerate(pc.parameters_list()):
+        arrays["p{0}".format(i)] = p.as_array()
+    for i, p in enumerate(pc.lookup_parameters_list()):
+        arrays["l{0}".format(i)] = p.as_array()
+    return arrays
+
+''' Nacita parametre ulozene cez Checkpointer do kolekcie 'pc' s rovnakou strukturou '''
+def load_checkpoint(pc, filename):
+    arrays = np.load(filename)
+    for i, p in enumerate(pc.parameters_list()):
+        p.set_value(arrays["p{0}".format(i)])
+    for i, p in enumerate(pc.lookup_parameters_list()):
+        p.init_from_array(arrays["l{0}".format(i)])
+
+''' Asynchronne ukladanie checkpointov: parametre sa skopiruju na konci kroku,
+    zapis do docasneho suboru a atomicke premenovanie robi vlakno na pozadi.
+    Na zapis caka najviac jedna kopia, ak vlakno nestiha, 'save' pocka (zapocita sa do blokovania).
+    Chyba vlakna sa znovu vyhodi v nasledujucom volani 'save' alebo 'close'.
+    Ponechava poslednych 'keep_last' checkpointov a 'keep_best' najlepsich podla UAS.
+'''
+class Checkpointer(object):
+
+    def __init__(self, pc, dirname, keep_last=3, keep_best=1):
+        self.pc = pc
+        self.dirname = dirname
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.steps = []
+        self.scores = {}
+        self.pending = set()
+        self.blocked = []
+        self.lock = threading.Lock()
+        self.queue = Queue(maxsize=1)
+        self.error = None
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self.thread = threading.Thread(target=self._write_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def filename(self, step):
+        return os.path.join(self.dirname, CHECKPOINT_FILENAME.format(step))
+
+    def save(self, step, pending_score=False):
+        self._check_error()
+        start = time.time()
+        if pending_score:
+            with self.lock:
+                self.pending.add(step)
+        arrays = snapshot(self.pc)
+        self.queue.put((step, arrays))
+        blocked = time.time() - start
+        self.blocked.append(blocked)
+        return blocked
+
+    def set_score(self, step, uas):
+        with self.lock:
+            self.scores[step] = uas
+            self.pending.discard(step)
+            self._apply_retention()
+
+    def best(self):
+        with self.lock:
+            if not self.scores:
+                return None
+            step = max(self.scores, key=lambda s: self.scores[s])
+            return step, self.scores[step]
+
+    def _check_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _write_loop(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            try:
+                self._write(*job)
+            except Exception as e:
+                self.error = e
+
+    def _write(self, step, arrays):
+        filename = self.filename(step)
+        tmp = filename + ".tmp"
+        with open(tmp, "wb") as fp:
+            np.savez(fp, **arrays)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.rename(tmp, filename)
+        with self.lock:
+            self.steps.append(step)
+            self._apply_retention()
+
+    def _apply_retention(self):
+        keep = set(self.steps[-self.keep_last:]) if self.keep_last > 0 else set()
+        scored = sorted(self.scores, key=lambda s: -self.scores[s])
+        keep.update(scored[:self.keep_best])
+        # checkpointy, ktore este cakaju na vysledok evaluacie, sa nemazu
+        keep.update(self.pending)
+        for step in [s for s in self.steps if s not in keep]:
+            filename = self.filename(step)
+            if os.path.exists(filename):
+                os.remove(filename)
+            self.steps.remove(step)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self._check_error()
+
+    def report(self):
+        if not self.blocked:
+            return
+        print("checkpoints: {0}, training blocked {1:.1f} ms per save (max {2:.1f} ms)".format(
+            len(self.blocked), 1000 * sum(self.blocked) / len(self.blocked), 1000 * max(self.blocked)))
@@ -1,25 +1,67 @@
 from __future__ import print_function
 
+import json
+import sys
 import dynet_config
-dynet_config.set(mem=1024,random_seed=12345)
+from argparse import ArgumentParser
+from memory import ModelDims, MemoryTracker, estimate_memory, max_sentence_length, memory_spec
 
-import sys
+''' Argumenty potrebne uz pred importom dynet-u, zdielane s uplnym parserom v _parse_args '''
+def _common_args(default_mem):
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument("--mem", default=default_mem)
+    parser.add_argument("--seed", default=12345, type=int)
+    parser.add_argument("--basename", default="../build/en")
+    parser.add_argument("--train", default=["../treebanks/train/en/en.conllu"], nargs='+')
+    parser.add_argument("--validation")
+    parser.add_argument("--batch_size", default=50, type=int)
+    parser.add_argument("--decode_workers", default=0, type=int)
+    parser.add_argument("--model_args", default={}, type=json.loads)
+    return parser
+
+def _dynet_args(argv, default_mem="1024"):
+    args, _ = _common_args(default_mem).parse_known_args(argv)
+    args.pools = None
+    if args.mem == "auto":
+        # velkosti poolov sa musia nastavit pred importom dynet-u
+        args.dims = ModelDims.from_basename(args.basename, **args.model_args)
+        max_length = max_sentence_length(args.train)
+        eval_length = max_sentence_length([args.validation]) if args.validation else max_length
+        args.pools = estimate_memory(args.dims, max_length, args.batch_size, eval_length, args.decode_workers > 0)
+        args.mem = memory_spec(args.pools)
+    return args
+
+_DYNET_ARGS = _dynet_args(sys.argv[1:], "auto") if __name__ == "__main__" else _dynet_args([])
+dynet_config.set(mem=_DYNET_ARGS.mem, random_seed=_DYNET_ARGS.seed)
+
+import os
 import random
 import dynet as dy
 import numpy as np
 from models import MLPParser, FIELDS
-from utils import DepTree, map_to_instances, read_conllu, read_index
+from checkpoint import Checkpointer
+from evaluation import AsyncEvaluator, evaluate_trees, print_metrics, stratified_sample
+from pipeline import DecoderPool
+from telemetry import Telemetry
+from utils import DEPREL, DepTree, map_to_instances, read_conllu, read_index, create_inverse_index
+from utils import chunked_stream, shuffle_buffer
 
 def arc_loss(model, tree):
     h = model.transduce(tree.feats)
-    scores = model.predict_arcs(h)
-    loss = [hinge_loss(sc, tree.heads[dep]) for dep, sc in enumerate(scores)]
+    with model.telemetry.phase("arc_scoring"):
+        scores = model.predict_arcs(h)
+        model.telemetry.sync(scores[-1])
+    with model.telemetry.phase("hinge_value"):
+        loss = [hinge_loss(sc, tree.heads[dep]) for dep, sc in enumerate(scores)]
     return dy.esum(loss)
 
 def label_loss(model, tree):
     h = model.transduce(tree.feats)
-    scores = model.predict_labels(tree.heads, h)
-    loss = [hinge_loss(sc, tree.labels[dep] - 1) for dep, sc in enumerate(scores)]
+    with model.telemetry.phase("label_scoring"):
+        scores = model.predict_labels(tree.heads, h)
+        model.telemetry.sync(scores[-1])
+    with model.telemetry.phase("hinge_value"):
+        loss = [hinge_loss(sc, tree.labels[dep] - 1) for dep, sc in enumerate(scores)]
     return dy.esum(loss)
 
 def hinge_loss(exprs, target, margin=1.0):
@@ -36,77 +78,240 @@ def shuffled_stream(data):
         for d in data:
             yield d
 
-def evaluate(model, validation_data):
-    num_tokens = 0.
-    correct_ua = correct_la = 0.
+def evaluate(model, validation_data, labels=None, details=False, decoder=None, verbose=True, bootstrap=0):
+    parsed_trees = []
 
     model.disable_dropout()
-    for i, gold in enumerate(validation_data):
-        num_tokens += len(gold)
-        parsed = model.parse(gold.feats)
-
-        for n in range(len(gold)):
-            if parsed.heads[n] == gold.heads[n]:
-                correct_ua += 1.
-                if parsed.labels[n] == gold.labels[n]:
-                    correct_la += 1.
+    if decoder is not None:
+        parsed = decoder.parse(model, (gold.feats for gold in validation_data))
+    else:
+        parsed = (model.parse(gold.feats) for gold in validation_data)
+    for i, (gold, tree) in enumerate(zip(validation_data, parsed)):
+        parsed_trees.append(tree)
+        model.telemetry.count(len(gold))
 
-        if (i % 100) == 0:
+        if verbose and (i % 100) == 0:
             print(".", end="")
             sys.stdout.flush()
     model.enable_dropout()
 
-    uas = correct_ua / num_tokens
-    las = correct_la / num_tokens
-    print("\nUAS: {0:.4}, LAS: {1:.4}".format(uas, las))
+    metrics = evaluate_trees(validation_data, parsed_trees, labels, bootstrap=bootstrap)
+    if verbose:
+        print()
+        print_metrics(metrics, details)
+    return metrics
+
+''' Vyhodnoti vzorku validacnych dat, cele data ('full_data') iba ak sa UAS na vzorke zlepsilo '''
+def evaluate_sampled(model, sample_data, full_data, labels, best_uas, bootstrap=0, decoder=None):
+    metrics = evaluate(model, sample_data, labels, decoder=decoder, verbose=False, bootstrap=bootstrap)
+    if full_data is not None and metrics["uas"] > best_uas:
+        metrics["full"] = evaluate(model, full_data, labels, decoder=decoder, verbose=False)
+    return metrics
+
+def _evaluate_snapshot(pc, model, sample_data, full_data, labels, best_uas, bootstrap, decode_workers, snapshot_file):
+    # pool rodica sa vo forknutom procese pouzit neda (jeho vlakna sa neskopiruju), proces si vytvori vlastny
+    decoder = DecoderPool(decode_workers) if decode_workers > 0 else None
+    try:
+        metrics = evaluate_sampled(model, sample_data, full_data, labels, best_uas, bootstrap, decoder)
+    finally:
+        if decoder is not None:
+            decoder.close()
+    if snapshot_file:
+        pc.save(snapshot_file)
+    return metrics
+
+def _parse_args():
+    parser = ArgumentParser(parents=[_common_args("auto")])
+
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--buffer_size", default=10000, type=int)
+    parser.add_argument("--chunk_size", default=100, type=int)
+    parser.add_argument("--max_steps", default=1000, type=int)
+    parser.add_argument("--eval_every", default=1000, type=int)
+    parser.add_argument("--results_log")
+    parser.add_argument("--checkpoint_dir")
+    parser.add_argument("--keep_last", default=3, type=int)
+    parser.add_argument("--keep_best", default=1, type=int)
+    parser.add_argument("--eval_details", action="store_true")
+    parser.add_argument("--eval_sample", default=0, type=int)
+    parser.add_argument("--bootstrap", default=1000, type=int)
+    parser.add_argument("--async_eval", action="store_true")
+    parser.add_argument("--model")
+    parser.add_argument("--telemetry", action="store_true")
+    parser.add_argument("--telemetry_log")
+
+    args = parser.parse_args()
+    if args.stream and not args.validation:
+        parser.error("--stream requires --validation")
+    return args
 
 if __name__ == "__main__":
+    args = _parse_args()
+    random.seed(args.seed)
 
-    basename = "../build/en"
+    basename = args.basename
     index = read_index(basename)
-    train_data = list(map_to_instances(read_conllu("../treebanks/train/en/en.conllu"), index, FIELDS))
+    if args.stream:
+        train_data = None
+        train_stream = map_to_instances(shuffle_buffer(chunked_stream(args.train, args.chunk_size), args.buffer_size), index, FIELDS)
+    else:
+        train_data = [tree for filename in args.train for tree in map_to_instances(read_conllu(filename), index, FIELDS)]
+        train_stream = shuffled_stream(train_data)
+    if args.validation:
+        validation_data = list(map_to_instances(read_conllu(args.validation), index, FIELDS))
+    else:
+        validation_data = train_data
+    labels = create_inverse_index({DEPREL: index[DEPREL]})[DEPREL]
+
+    # vzorka sa vyberie raz, pocas trenovania sa vyhodnocuje iba ona
+    if 0 < args.eval_sample < len(validation_data):
+        sample_data = [validation_data[i] for i in stratified_sample(validation_data, args.eval_sample, seed=args.seed)]
+        full_data = validation_data
+        print("validation sample: {0} of {1} sentences".format(len(sample_data), len(validation_data)))
+    else:
+        sample_data, full_data = validation_data, None
+    bootstrap = args.bootstrap if full_data is not None else 0
 
     pc = dy.ParameterCollection()
-    model = MLPParser(pc, basename="../build/en")
+    model = MLPParser(pc, basename=basename, **args.model_args)
     model.enable_dropout()
     trainer = dy.AdamTrainer(pc)
 
-    print("training sentences: {0}, tokens: {1}".format(len(train_data), sum([len(tree) for tree in train_data])))
+    telemetry = Telemetry(enabled=args.telemetry, logfile=args.telemetry_log)
+    model.telemetry = telemetry
 
-    batch_size = 50
-    max_steps = 1000
+    memory_tracker = None
+    if _DYNET_ARGS.pools is not None:
+        print("dynet memory (forward, backward, parameters): {0} MB".format(_DYNET_ARGS.mem))
+        memory_tracker = MemoryTracker(_DYNET_ARGS.dims, _DYNET_ARGS.pools)
+
+    evaluator = AsyncEvaluator(_evaluate_snapshot) if args.async_eval else None
+    decoder = DecoderPool(args.decode_workers) if args.decode_workers > 0 else None
+    best_uas, best_step = -1.0, 0
+
+    def _snapshot_file(step):
+        return "{0}.{1}".format(args.model, step) if args.model else None
+
+    results_log = open(args.results_log, "a") if args.results_log else None
+    checkpointer = Checkpointer(pc, args.checkpoint_dir, args.keep_last, args.keep_best) if args.checkpoint_dir else None
+
+    def _update_best(step, metrics, snapshot_file=None):
+        global best_uas, best_step
+        if results_log is not None:
+            result = {"step": step, "uas": metrics["uas"], "las": metrics["las"]}
+            if "full" in metrics:
+                result["full_uas"], result["full_las"] = metrics["full"]["uas"], metrics["full"]["las"]
+            print(json.dumps(result), file=results_log)
+            results_log.flush()
+        if checkpointer is not None:
+            checkpointer.set_score(step, metrics["uas"])
+        if metrics["uas"] > best_uas:
+            best_uas, best_step = metrics["uas"], step
+            if snapshot_file:
+                os.rename(snapshot_file, args.model)
+        elif snapshot_file:
+            os.remove(snapshot_file)
+
+    def _report(step, metrics, snapshot_file=None):
+        print("\nstep {0} ".format(step), end="")
+        print_metrics(metrics, args.eval_details)
+        if "full" in metrics:
+            print("full validation ", end="")
+            print_metrics(metrics["full"], args.eval_details)
+        _update_best(step, metrics, snapshot_file)
+
+    # forknuty proces vysledok nepozna vopred, model ulozi do <model>.<krok> a ten sa tu premenuje alebo zmaze
+    def _report_async(results):
+        for step, metrics in results:
+            _report(step, metrics, _snapshot_file(step))
+
+    if train_data is not None:
+        print("training sentences: {0}, tokens: {1}".format(len(train_data), sum([len(tree) for tree in train_data])))
+
+    batch_size = args.batch_size
+    max_steps = args.max_steps
 
     step = 0
     total_loss = 0
     batch_loss = []
+    batch_lengths = []
     batch_tokens = 0
 
     dy.renew_cg()
-    for tree in shuffled_stream(train_data):
+    for tree in train_stream:
 
         batch_loss.append(arc_loss(model, tree))
         batch_loss.append(label_loss(model, tree))
 
         batch_tokens += len(tree)
+        batch_lengths.append(len(tree))
+        telemetry.count_graph(len(tree), batch_loss[-1])
+
         if batch_tokens >= batch_size:
             loss = dy.esum(batch_loss) * (1.0 / batch_tokens)
-            total_loss += loss.value()
-            loss.backward()
-            trainer.update()
+            with telemetry.phase("forward"):
+                total_loss += loss.value()
+            with telemetry.phase("backward"):
+                loss.backward()
+            with telemetry.phase("update"):
+                trainer.update()
 
             dy.renew_cg()
+            telemetry.renew_graph()
+            step += 1
+            if memory_tracker is not None:
+                memory_tracker.step(step, batch_lengths)
             batch_loss = []
+            batch_lengths = []
             batch_tokens = 0
-            step += 1
 
             if (step % 100) == 0:
                 print(".", end="")
                 sys.stdout.flush()
 
-            if (step % 1000) == 0:
-                print("\naverage loss: {0}".format(total_loss / 1000))
-                evaluate(model, train_data)
+            if evaluator is not None:
+                _report_async(evaluator.poll())
+
+            if (step % args.eval_every) == 0:
+                print("\naverage loss: {0}".format(total_loss / args.eval_every))
+                telemetry.report(step)
+                if memory_tracker is not None:
+                    memory_tracker.report()
+                if checkpointer is not None:
+                    blocked = checkpointer.save(step, pending_score=True)
+                    print("checkpoint {0}: training blocked {1:.1f} ms".format(step, blocked * 1000))
+                if evaluator is not None:
+                    # vysledok predchadzajucej evaluacie sa musi spracovat skor, nez sa precita best_uas
+                    _report_async(evaluator.wait_for_slot())
+                    _report_async(evaluator.submit(step, pc, model, sample_data, full_data, labels, best_uas, bootstrap,
+                                                   args.decode_workers, _snapshot_file(step)))
+                else:
+                    metrics = evaluate_sampled(model, sample_data, full_data, labels, best_uas, bootstrap, decoder)
+                    if args.model and metrics["uas"] > best_uas:
+                        pc.save(args.model)
+                    _report(step, metrics)
+                    telemetry.report(step, "evaluate")
                 total_loss = 0.0
 
             if step >= max_steps:
                 break
+
+    if evaluator is not None:
+        _report_async(evaluator.close())
+    if best_step > 0:
+        print("best UAS: {0:.4} at step {1}".format(best_uas, best_step))
+    if full_data is not None:
+        print("final full validation ", end="")
+        evaluate(model, full_data, labels, args.eval_details, decoder)
+    if decoder is not None:
+        decoder.close()
+    if memory_tracker is not None:
+        memory_tracker.report()
+
+    if checkpointer is not None:
+        checkpointer.close()
+        checkpointer.report()
+
+    telemetry.close()
+    if results_log is not None:
+        results_log.close()
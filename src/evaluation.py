@@ -0,0 +1,193 @@
+from __future__ import print_function
+
+import multiprocessing
+import sys
+import traceback
+import numpy as np
+from collections import OrderedDict
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+from utils import INDEX_DTYPE
+
+LENGTH_BUCKETS = (10, 20, 30, 40, 50)
+DISTANCE_BUCKETS = (1, 2, 3, 4, 5, 7, 10)
+
+''' Spoji hlavy a znacky vsetkych stromov do jednorozmernych poli '''
+def stack_trees(trees):
+    lengths = np.array([len(t) for t in trees], dtype=np.int64)
+    heads = np.concatenate([t.heads for t in trees]) if trees else np.zeros(0, dtype=INDEX_DTYPE)
+    labels = np.concatenate([t.labels for t in trees]) if trees else np.zeros(0, dtype=INDEX_DTYPE)
+    return lengths, heads, labels
+
+def _bucket_names(edges):
+    names = ["<={0}".format(edges[0])]
+    names += ["{0}-{1}".format(lo + 1, hi) if hi > lo + 1 else str(hi) for lo, hi in zip(edges, edges[1:])]
+    names.append(">{0}".format(edges[-1]))
+    return names
+
+def _breakdown(keys, correct_ua, correct_la, names):
+    num_keys = len(names)
+    total = np.bincount(keys, minlength=num_keys)
+    ua = np.bincount(keys, weights=correct_ua, minlength=num_keys)
+    la = np.bincount(keys, weights=correct_la, minlength=num_keys)
+    breakdown = OrderedDict()
+    for k in np.flatnonzero(total):
+        breakdown[names[k]] = (int(total[k]), ua[k] / total[k], la[k] / total[k])
+    return breakdown
+
+''' Vrati indexy vzorky 'size' stromov, v ktorej je kazdy interval dlzok viet zastupeny
+    v rovnakom pomere ako v 'trees' (kvoty sa zaokruhluju metodou najvacsich zvyskov)
+'''
+def stratified_sample(trees, size, length_buckets=LENGTH_BUCKETS, seed=1):
+    if size >= len(trees):
+        return list(range(len(trees)))
+    rng = np.random.RandomState(seed)
+    buckets = np.digitize([len(t) for t in trees], length_buckets, right=True)
+    counts = np.bincount(buckets)
+    shares = counts * size / float(len(trees))
+    quotas = np.floor(shares).astype(np.int64)
+    for k in np.argsort(quotas - shares)[:size - quotas.sum()]:
+        quotas[k] += 1
+    indices = []
+    for k in np.flatnonzero(quotas):
+        indices.extend(rng.choice(np.flatnonzero(buckets == k), quotas[k], replace=False))
+    return sorted(int(i) for i in indices)
+
+''' Bootstrap intervaly spolahlivosti pre UAS a LAS, vety sa vyberaju s opakovanim '''
+def bootstrap_intervals(lengths, correct_ua, correct_la, num_samples=1000, alpha=0.05, seed=1):
+    sentence_ids = np.repeat(np.arange(len(lengths)), lengths)
+    ua = np.bincount(sentence_ids, weights=correct_ua, minlength=len(lengths))
+    la = np.bincount(sentence_ids, weights=correct_la, minlength=len(lengths))
+    rng = np.random.RandomState(seed)
+    samples = rng.randint(0, len(lengths), size=(num_samples, len(lengths)))
+    tokens = lengths[samples].sum(axis=1).astype(np.float64)
+    bounds = [50. * alpha, 100. - 50. * alpha]
+    uas = np.percentile(ua[samples].sum(axis=1) / tokens, bounds)
+    las = np.percentile(la[samples].sum(axis=1) / tokens, bounds)
+    return (float(uas[0]), float(uas[1])), (float(las[0]), float(las[1]))
+
+''' Vrati UAS/LAS a presnosti podla DEPREL, dlzky vety a dlzky hrany, vypocitane jednym prechodom nad spojenymi poliami '''
+def evaluate_trees(gold_trees, parsed_trees, labels=None,
+                   length_buckets=LENGTH_BUCKETS, distance_buckets=DISTANCE_BUCKETS, bootstrap=0):
+    lengths, gold_heads, gold_labels = stack_trees(gold_trees)
+    _, parsed_heads, parsed_labels = stack_trees(parsed_trees)
+
+    num_tokens = len(gold_heads)
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.arange(num_tokens) - offsets + 1
+    sentence_lengths = np.repeat(lengths, lengths)
+    distances = np.abs(gold_heads - positions)
+
+    correct_ua = gold_heads == parsed_heads
+    correct_la = correct_ua & (gold_labels == parsed_labels)
+
+    metrics = OrderedDict()
+    metrics["num_tokens"] = num_tokens
+    metrics["uas"] = correct_ua.mean() if num_tokens else 0.
+    metrics["las"] = correct_la.mean() if num_tokens else 0.
+    if bootstrap > 0 and num_tokens:
+        metrics["uas_ci"], metrics["las_ci"] = bootstrap_intervals(lengths, correct_ua, correct_la, bootstrap)
+
+    num_labels = int(gold_labels.max()) + 1 if num_tokens else 1
+    if labels is None:
+        label_names = [str(i) for i in range(num_labels)]
+    else:
+        label_names = [labels.get(i, str(i)) for i in range(num_labels)]
+    metrics["per_label"] = _breakdown(gold_labels, correct_ua, correct_la, label_names)
+    metrics["per_length"] = _breakdown(np.digitize(sentence_lengths, length_buckets, right=True),
+                                       correct_ua, correct_la, _bucket_names(length_buckets))
+    metrics["per_distance"] = _breakdown(np.digitize(distances, distance_buckets, right=True),
+                                         correct_ua, correct_la, _bucket_names(distance_buckets))
+    return metrics
+
+def print_metrics(metrics, details=False, file=sys.stdout):
+    if "uas_ci" in metrics:
+        print("UAS: {0:.4} [{1:.4}, {2:.4}], LAS: {3:.4} [{4:.4}, {5:.4}]".format(
+            metrics["uas"], metrics["uas_ci"][0], metrics["uas_ci"][1],
+            metrics["las"], metrics["las_ci"][0], metrics["las_ci"][1]), file=file)
+    else:
+        print("UAS: {0:.4}, LAS: {1:.4}".format(metrics["uas"], metrics["las"]), file=file)
+    if not details:
+        return
+    for name, title in [("per_label", "DEPREL"), ("per_length", "sentence length"), ("per_distance", "arc distance")]:
+        print("{0:<16} {1:>8} {2:>7} {3:>7}".format(title, "tokens", "UAS", "LAS"), file=file)
+        for key, (total, uas, las) in metrics[name].items():
+            print("{0:<16} {1:>8} {2:>7.4f} {3:>7.4f}".format(key, total, uas, las), file=file)
+
+RECEIVE_TIMEOUT = 1.0
+
+# chyba sa posle rodicovi namiesto metrik, inak by rodic na vysledok cakal navzdy
+def _run_evaluation(evaluate, queue, step, args):
+    try:
+        result = evaluate(*args)
+    except Exception as e:
+        traceback.print_exc()
+        result = e
+    queue.put((step, result))
+
+''' Spusta 'evaluate' v samostatnom procese. Proces vznika vzdy cez fork (model a parametre
+    DyNet-u sa nedaju picklovat), takze pracuje s kopiou parametrov z okamihu volania 'submit'
+    a trenovanie medzitym pokracuje. Vysledky su dvojice (krok, metriky) v poradi, v akom dorazia.
+'''
+class AsyncEvaluator(object):
+
+    def __init__(self, evaluate, max_pending=1):
+        self.evaluate = evaluate
+        self.max_pending = max_pending
+        self.context = multiprocessing.get_context("fork")
+        self.queue = self.context.Queue()
+        self.pending = {}
+
+    ''' Pocka na vysledky, kym sa neuvolni miesto pre dalsi 'submit' '''
+    def wait_for_slot(self):
+        results = []
+        while len(self.pending) >= self.max_pending:
+            results.append(self._receive(block=True))
+        return results
+
+    def submit(self, step, *args):
+        results = self.wait_for_slot()
+        process = self.context.Process(target=_run_evaluation, args=(self.evaluate, self.queue, step, args))
+        process.start()
+        self.pending[step] = process
+        return results
+
+    def _receive(self, block):
+        while True:
+            try:
+                step, result = self.queue.get(block, RECEIVE_TIMEOUT if block else None)
+                break
+            except Empty:
+                if not block:
+                    raise
+            dead = [s for s, process in self.pending.items() if process.exitcode is not None]
+            if dead:
+                try:
+                    # vysledok mohol este ostat v rure, hoci proces uz skoncil
+                    step, result = self.queue.get(True, RECEIVE_TIMEOUT)
+                    break
+                except Empty:
+                    process = self.pending.pop(dead[0])
+                    process.join()
+                    raise RuntimeError("evaluation at step {0} exited with code {1} without a result".format(dead[0], process.exitcode))
+        self.pending.pop(step).join()
+        if isinstance(result, Exception):
+            raise result
+        return step, result
+
+    def poll(self):
+        results = []
+        while self.pending:
+            try:
+                results.append(self._receive(block=False))
+            except Empty:
+                break
+        return results
+
+    def close(self):
+        results = []
+        while self.pending:
+            results.append(self._receive(block=True))
+        return results
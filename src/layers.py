@@ -16,20 +16,16 @@ class Embeddings(object):
         self.spec = (dims, dropout, update)
 
     def __call__(self, feats):
-
-        def _lookup(i, f):
-            embds = dy.lookup(self.lookup[f], feats[i,f], update=self.update[f])
+        num_tokens, num_feats = feats.shape
+        x = []
+        for f in range(num_feats):
+            embds = dy.lookup_batch(self.lookup[f], feats[:, f].tolist(), update=self.update[f])
             dropout = self.dropout[f]
             if dropout > 0:
                 embds = dy.dropout(embds, dropout)
-            return embds
-
-        num_tokens, num_feats = feats.shape
-        if num_feats > 1:
-            x = [dy.concatenate([_lookup(i,f) for f in range(num_feats)]) for i in range(num_tokens)]
-        else:
-            x = [_lookup(i,0) for i in range(num_tokens)]
-        return x
+            x.append(embds)
+        x = dy.concatenate(x) if num_feats > 1 else x[0]
+        return [dy.pick_batch_elem(x, i) for i in range(num_tokens)]
 
     def set_dropout(self, dropout):
         self.dropout = dropout if isinstance(dropout, (tuple, list)) else [dropout] * len(self.lookup)
@@ -148,22 +144,22 @@ class BiLSTM(object):
         self.pc = model.add_subcollection()
         self.dims = (input_dim, hidden_dim)
 
-        def _build_layer(input_dim, hidden_dim, rnn_builder=dy.VanillaLSTMBuilder):
-            f = rnn_builder(1, input_dim, hidden_dim / 2, self.pc, ln)
-            b = rnn_builder(1, input_dim, hidden_dim / 2, self.pc, ln)
-            return (f, b)
-
         self.BOS = self.pc.add_parameters(input_dim)
         self.EOS = self.pc.add_parameters(input_dim)
         self.ROOT = self.pc.add_parameters(input_dim)
 
-        self.layers = [_build_layer(input_dim, hidden_dim)]
+        self.layers = [self._build_layer(input_dim, hidden_dim, ln)]
         for _ in range(num_layers - 1):
-            self.layers.append(_build_layer(hidden_dim, hidden_dim))
+            self.layers.append(self._build_layer(hidden_dim, hidden_dim, ln))
         self.set_dropouts(input_dropout, output_dropout)
 
         self.spec = input_dim, hidden_dim, num_layers, input_dropout, output_dropout, ln
 
+    def _build_layer(self, input_dim, hidden_dim, ln):
+        f = dy.VanillaLSTMBuilder(1, input_dim, hidden_dim // 2, self.pc, ln)
+        b = dy.VanillaLSTMBuilder(1, input_dim, hidden_dim // 2, self.pc, ln)
+        return (f, b)
+
     def __call__(self, x):
         x = [dy.parameter(self.BOS), dy.parameter(self.ROOT)] + x + [dy.parameter(self.EOS)]
         h = self.transduce(x)
@@ -197,3 +193,62 @@ class BiLSTM(object):
     def from_spec(spec, model):
         input_dim, hidden_dim, num_layers, input_dropout, output_dropout, ln = spec
         return BiLSTM(model, input_dim, hidden_dim, num_layers, input_dropout, output_dropout, ln)
+
+''' Stlpce matice 'matrix' ako zoznam vyrazov; stlpec sa vyberie (dy.pick) az pri prvom pristupe,
+    takze kod, ktory pracuje priamo s maticou, nepridava do grafu uzly pre jednotlive stlpce
+'''
+class ColumnList(object):
+
+    def __init__(self, matrix, num_cols):
+        self.matrix = matrix
+        self.cols = [None] * num_cols
+
+    def __len__(self):
+        return len(self.cols)
+
+    def __getitem__(self, i):
+        col = self.cols[i]
+        if col is None:
+            col = self.cols[i] = dy.pick(self.matrix, i % len(self.cols), 1)
+        return col
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.cols)))
+
+class FusedBiLSTM(BiLSTM):
+
+    def __init__(self, model, input_dim, hidden_dim, num_layers=1, input_dropout=0, output_dropout=0, ln=False):
+        if ln:
+            raise ValueError("CompactVanillaLSTMBuilder does not support layer normalization")
+        super(FusedBiLSTM, self).__init__(model, input_dim, hidden_dim, num_layers, input_dropout, output_dropout, ln)
+
+    def _build_layer(self, input_dim, hidden_dim, ln):
+        f = dy.CompactVanillaLSTMBuilder(1, input_dim, hidden_dim // 2, self.pc)
+        b = dy.CompactVanillaLSTMBuilder(1, input_dim, hidden_dim // 2, self.pc)
+        return (f, b)
+
+    def __call__(self, x):
+        return ColumnList(self.matrix(x), len(x) + 1)
+
+    def matrix(self, x):
+        x = [dy.parameter(self.BOS), dy.parameter(self.ROOT)] + x + [dy.parameter(self.EOS)]
+        h = self.transduce_matrix(x)
+        return dy.select_cols(h, list(range(1, len(x) - 1)))
+
+    def transduce_matrix(self, x):
+        for (f,b) in self.layers[:-1]:
+            fs = f.initial_state().transduce(x)
+            bs = b.initial_state().transduce(reversed(x))
+            x = [dy.concatenate([f,b]) for f,b in zip(fs, reversed(bs))]
+        f, b = self.layers[-1]
+        fs = f.initial_state().transduce(x)
+        bs = b.initial_state().transduce(reversed(x))
+        return dy.concatenate([dy.concatenate_cols(fs), dy.concatenate_cols(list(reversed(bs)))])
+
+    def transduce(self, x):
+        return ColumnList(self.transduce_matrix(x), len(x))
+
+    @staticmethod
+    def from_spec(spec, model):
+        input_dim, hidden_dim, num_layers, input_dropout, output_dropout, ln = spec
+        return FusedBiLSTM(model, input_dim, hidden_dim, num_layers, input_dropout, output_dropout, ln)
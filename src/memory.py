@@ -0,0 +1,144 @@
+from __future__ import print_function
+
+import codecs
+import math
+import resource
+from utils import FIELD_TO_STR, DEPREL, FIELDS, read_index
+
+BYTES_PER_FLOAT = 4
+MB = 1024 * 1024
+
+# hodnota, gradient a dva momenty AdamTrainer-a
+PARAM_COPIES = 4
+SAFETY_FACTOR = 1.5
+MIN_POOL_MB = 32
+
+''' Rozmery modelu MLPParser pre odhad pamate (zhodne s predvolenymi hodnotami v models.py) '''
+class ModelDims(object):
+
+    def __init__(self, vocab_sizes, embedding_dims, num_labels, **kwargs):
+        self.vocab_sizes = vocab_sizes
+        self.embedding_dims = embedding_dims
+        self.num_labels = num_labels
+        self.input_dim = sum(embedding_dims)
+        self.lstm_dim = kwargs.get("lstm_dim", 250)
+        self.lstm_num_layers = kwargs.get("lstm_num_layers", 2)
+        self.arc_dim = kwargs.get("arc_mlp_dim", 100) * kwargs.get("arc_mlp_num_layers", 1)
+        self.label_dim = kwargs.get("label_mlp_dim", 100) * kwargs.get("label_mlp_num_layers", 1)
+
+    @staticmethod
+    def from_basename(basename, fields=FIELDS, **kwargs):
+        index = read_index(basename)
+        vocab_sizes = [len(index[f]) + 1 for f in fields]
+        embedding_dims = []
+        for f in fields:
+            with codecs.open("{0}_{1}_vectors.txt".format(basename, FIELD_TO_STR[f]), "r", "utf-8") as fp:
+                embedding_dims.append(int(fp.readline().split(" ")[1]))
+        return ModelDims(vocab_sizes, embedding_dims, len(index[DEPREL]), **kwargs)
+
+    def parameter_floats(self):
+        d, h = self.lstm_dim, self.lstm_dim // 2
+        floats = sum(v * e for v, e in zip(self.vocab_sizes, self.embedding_dims))
+        floats += 3 * self.input_dim
+        input_dim = self.input_dim
+        for _ in range(self.lstm_num_layers):
+            floats += 2 * 4 * h * (input_dim + h + 1)
+            input_dim = d
+        floats += (2 * d + 1) * self.arc_dim + self.arc_dim
+        floats += (2 * d + 1) * self.label_dim + self.label_dim * self.num_labels
+        return floats
+
+    ''' Priblizny pocet floatov vo vypoctovom grafe pre arc_loss + label_loss jednej vety dlzky n '''
+    def sentence_floats(self, n):
+        d = self.lstm_dim
+        num_nodes = n + 1
+        transduce = n * 3 * self.input_dim + (n + 3) * self.lstm_num_layers * 11 * d
+        arcs = n * num_nodes * (2 * d + 2 * self.arc_dim + 3)
+        labels = n * (2 * d + 2 * self.label_dim + 2 * self.num_labels)
+        return 2 * transduce + arcs + labels
+
+    def batch_floats(self, lengths):
+        return sum(self.sentence_floats(n) for n in lengths)
+
+    ''' Priblizny pocet floatov grafu pri parsovani vety dlzky n (bez spatneho prechodu),
+        pri all_labels=True so skore znaciek pre vsetky dvojice (MSTParser.score pre --decode_workers)
+    '''
+    def parse_floats(self, n, all_labels=False):
+        d = self.lstm_dim
+        num_nodes = n + 1
+        transduce = n * 3 * self.input_dim + (n + 3) * self.lstm_num_layers * 11 * d
+        arcs = n * num_nodes * (2 * d + 2 * self.arc_dim + 3)
+        if all_labels:
+            labels = n * num_nodes * (d + 2 * self.label_dim + 2 * self.num_labels)
+        else:
+            labels = n * (2 * d + 2 * self.label_dim + 2 * self.num_labels)
+        return transduce + arcs + labels
+
+def _mb(floats):
+    return floats * BYTES_PER_FLOAT / float(MB)
+
+''' Vrati dlzku najdlhsej vety v suboroch (rychly prechod bez parsovania tokenov) '''
+def max_sentence_length(filenames):
+    max_len = 0
+    for filename in filenames:
+        n = 0
+        with open(filename, "rb") as fp:
+            for line in fp:
+                if not line.strip():
+                    max_len = max(max_len, n)
+                    n = 0
+                    continue
+                token_id = line.split(b"\t", 1)[0]
+                if token_id.isdigit():
+                    n += 1
+        max_len = max(max_len, n)
+    return max_len
+
+''' Odhadne velkost forward, backward a parameter poolu DyNet-u v MB.
+    Najhorsia trenovacia davka je najdlhsia veta a k nej este (batch_size - 1) tokenov dalsej vety,
+    forward pool musi pojat aj parsovanie najdlhsej validacnej vety 'eval_length'.
+'''
+def estimate_memory(dims, max_length, batch_size, eval_length=0, all_labels=False):
+    backward = dims.batch_floats([max_length, max(batch_size - 1, 0)])
+    forward = max(backward, dims.parse_floats(eval_length, all_labels))
+    sizes = (_mb(forward), _mb(backward), _mb(dims.parameter_floats() * PARAM_COPIES))
+    return tuple(max(MIN_POOL_MB, int(math.ceil(size * SAFETY_FACTOR))) for size in sizes)
+
+def memory_spec(sizes):
+    return ",".join(str(size) for size in sizes)
+
+''' Maximum RSS procesu v MB (Linux vracia ru_maxrss v kB) '''
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+''' Po kazdom kroku zaznamena nameranu pamat: narast maxima RSS oproti stavu pred trenovanim,
+    ktory zodpoveda strankam, na ktore DyNet v pooloch skutocne siahol. Vedla neho uvadza
+    odhad z modelu (ten isty, z ktoreho sa pooly nastavili), aby sa dal odhad overit.
+'''
+class MemoryTracker(object):
+
+    def __init__(self, dims, pool_sizes):
+        self.dims = dims
+        self.pool_sizes = pool_sizes
+        self.baseline = peak_rss_mb()
+        self.peak_growth = 0.
+        self.peak_growth_step = 0
+        self.peak_estimate = 0.
+        self.peak_estimate_step = 0
+
+    def step(self, step, lengths):
+        growth = peak_rss_mb() - self.baseline
+        if growth > self.peak_growth:
+            self.peak_growth = growth
+            self.peak_growth_step = step
+        estimate = _mb(self.dims.batch_floats(lengths))
+        if estimate > self.peak_estimate:
+            self.peak_estimate = estimate
+            self.peak_estimate_step = step
+
+    def report(self):
+        forward, backward, params = self.pool_sizes
+        print("memory: measured peak RSS growth {0:.1f} MB (step {1}), max RSS {2:.1f} MB; pools forward {3} MB, backward {4} MB, parameters {5} MB".format(
+            self.peak_growth, self.peak_growth_step, peak_rss_mb(), forward, backward, params))
+        print("memory estimate (model, not measured): training graph {0:.1f} MB per forward/backward pool (step {1}), parameters {2:.1f} MB".format(
+            self.peak_estimate, self.peak_estimate_step, _mb(self.dims.parameter_floats() * PARAM_COPIES)))
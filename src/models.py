@@ -2,12 +2,13 @@ from __future__ import print_function
 
 import dynet as dy
 import numpy as np
-from layers import Embeddings, BiLSTM, MultiLayerPerceptron
-from utils import FORM, UPOS, DEPREL, read_index, parse_nonprojective, DepTree
+from layers import Embeddings, BiLSTM, FusedBiLSTM, ColumnList, MultiLayerPerceptron, Dense
+from utils import FIELDS, DEPREL, SCORE_DTYPE, read_index, parse_nonprojective, DepTree
+from telemetry import NULL_TELEMETRY
+from numpy_parser import save_arrays
+from collections import OrderedDict
 from abc import ABCMeta, abstractmethod
 
-FIELDS = (FORM, UPOS)
-
 class MSTParser(object):
 
     def __init__(self, model, **kwargs):
@@ -22,13 +23,19 @@ class MSTParser(object):
         lstm_dim = kwargs.get("lstm_dim", 250)
         self.embeddings = Embeddings.init_from_word2vec(self.pc, basename, FIELDS, index=index)
         input_dim = self.embeddings.dim
-        self.lstm = BiLSTM(self.pc, input_dim, lstm_dim, lstm_num_layers)
+        lstm_type = FusedBiLSTM if kwargs.get("lstm_fused", False) else BiLSTM
+        self.lstm = lstm_type(self.pc, input_dim, lstm_dim, lstm_num_layers)
 
         self.spec = kwargs,
+        self.telemetry = NULL_TELEMETRY
 
     def transduce(self, feats):
-        x = self.embeddings(feats)
-        h = self.lstm(x)
+        with self.telemetry.phase("embeddings"):
+            x = self.embeddings(feats)
+            self.telemetry.sync(x[-1])
+        with self.telemetry.phase("lstm"):
+            h = self.lstm(x)
+            self.telemetry.sync(h[-1])
         return h
 
     @abstractmethod
@@ -52,24 +59,47 @@ class MSTParser(object):
         labels = [self._predict_labels(heads[dep-1], dep, h) for dep in range(1, num_nodes)]
         return labels
 
+    def _predict_all_labels(self, dep, h):
+        return dy.concatenate_cols([self._predict_labels(head, dep, h) for head in range(len(h))])
+
+    def predict_all_labels(self, h):
+        return [self._predict_all_labels(dep, h) for dep in range(1, len(h))]
+
+    def _arc_weights(self, h):
+        num_nodes = len(h)
+        weights = np.zeros((num_nodes, num_nodes), dtype=SCORE_DTYPE)
+        for dep, s in enumerate(self.predict_arcs(h), 1):
+            weights[:, dep] = s.npvalue()
+        return weights
+
     def _parse_heads(self, heads, h):
-        scores = self.predict_arcs(h)
-        weights = np.transpose(np.vstack([np.zeros(len(h))] + [s.npvalue() for s in scores]))
-        parse_nonprojective(weights, heads)
+        with self.telemetry.phase("arc_scoring"):
+            weights = self._arc_weights(h)
+        with self.telemetry.phase("decode"):
+            parse_nonprojective(weights, heads)
 
     def _parse_labels(self, heads, labels, h):
-        scores = self.predict_labels(heads, h)
-        labels[:] = [np.argmax(scores[i].npvalue()) + 1 for i in range(len(scores))]
+        with self.telemetry.phase("label_scoring"):
+            scores = self.predict_labels(heads, h)
+            labels[:] = [np.argmax(scores[i].npvalue()) + 1 for i in range(len(scores))]
 
     def parse(self, feats):
         dy.renew_cg()
-        x = self.embeddings(feats)
-        h = self.lstm(x)
-        tree = DepTree(len(x))
+        h = self.transduce(feats)
+        tree = DepTree(len(feats))
         self._parse_heads(tree.heads, h)
         self._parse_labels(tree.heads, tree.labels, h)
         return tree
 
+    def score(self, feats):
+        dy.renew_cg()
+        h = self.transduce(feats)
+        with self.telemetry.phase("arc_scoring"):
+            weights = self._arc_weights(h)
+        with self.telemetry.phase("label_scoring"):
+            label_scores = np.stack([s.npvalue() for s in self.predict_all_labels(h)]).astype(SCORE_DTYPE, copy=False)
+        return weights, label_scores
+
     def disable_dropout(self):
         self.embeddings.disable_dropout()
         self.lstm.disable_dropout()
@@ -83,7 +113,12 @@ class MSTParser(object):
 
     __metaclass__ = ABCMeta
 
+''' Vystup BiLSTM ako matica so stlpcami pre jednotlive uzly; FusedBiLSTM ju vracia priamo '''
+def _as_matrix(h):
+    return h.matrix if isinstance(h, ColumnList) else dy.concatenate_cols(h)
+
 _STR_TO_ACT = {"tanh": dy.tanh, "sigmoid": dy.logistic, "relu": dy.rectify}
+_ACT_TO_STR = {v: k for k, v in _STR_TO_ACT.items()}
 
 def _build_mlp(model, kwargs, prefix, input_dim, hidden_dim, output_dim, num_layers, act):
     hidden_dim = kwargs.get(prefix + "_dim", hidden_dim)
@@ -110,6 +145,34 @@ class MLPParser(MSTParser):
         y = self.label_mlp(x)
         return y
 
+    def _predict_all_labels(self, dep, h, WH=None):
+        if WH is None:
+            x = dy.concatenate([_as_matrix(h), dy.concatenate_cols([h[dep]] * len(h))])
+            return self.label_mlp(x)
+
+        layers = self.label_mlp.layers
+        dropout = self.label_mlp.dropout
+        first = layers[0]
+        lstm_dim = self.lstm.dims[1]
+        WD = dy.select_cols(dy.parameter(first.W), list(range(lstm_dim, 2 * lstm_dim)))
+        x = first.act(dy.colwise_add(WH, WD * h[dep] + dy.parameter(first.b)))
+        if dropout > 0:
+            x = dy.dropout(x, dropout)
+        for layer in layers[1:]:
+            x = layer(x)
+            if dropout > 0:
+                x = dy.dropout(x, dropout)
+        return x
+
+    def predict_all_labels(self, h):
+        first = self.label_mlp.layers[0]
+        WH = None
+        if isinstance(first, Dense) and not first.ln:
+            # prva vrstva je linearna v [h_head; h_dep], cast pre hlavy sa spocita raz pre celu vetu
+            lstm_dim = self.lstm.dims[1]
+            WH = dy.select_cols(dy.parameter(first.W), list(range(lstm_dim))) * _as_matrix(h)
+        return [self._predict_all_labels(dep, h, WH) for dep in range(1, len(h))]
+
     def disable_dropout(self):
         super(MLPParser, self).disable_dropout()
         self.arc_mlp.disable_dropout()
@@ -120,6 +183,42 @@ class MLPParser(MSTParser):
         self.arc_mlp.set_dropout(self.kwargs.get("arc_mlp_dropout", 0))
         self.label_mlp.set_dropout(self.kwargs.get("label_mlp_dropout", 0))        
 
+    def export(self, dirname):
+        arrays = OrderedDict()
+        for i, lookup in enumerate(self.embeddings.lookup):
+            arrays["embeddings_{0}".format(i)] = lookup.as_array()
+
+        if self.lstm.spec[-1]:
+            raise ValueError("layer normalized LSTM cannot be exported")
+        if isinstance(self.lstm, FusedBiLSTM):
+            # NumpyParser pocita hradla ako VanillaLSTMBuilder, pre CompactVanillaLSTMBuilder to nie je overene
+            raise ValueError("fused LSTM (lstm_fused=True) cannot be exported")
+        arrays["lstm_bos"] = self.lstm.BOS.as_array()
+        arrays["lstm_eos"] = self.lstm.EOS.as_array()
+        arrays["lstm_root"] = self.lstm.ROOT.as_array()
+        for l, layer in enumerate(self.lstm.layers):
+            for d, builder in zip(("f", "b"), layer):
+                (Wx, Wh, b), = builder.get_parameters()
+                arrays["lstm_{0}{1}_wx".format(l, d)] = Wx.as_array()
+                arrays["lstm_{0}{1}_wh".format(l, d)] = Wh.as_array()
+                arrays["lstm_{0}{1}_b".format(l, d)] = b.as_array()
+
+        meta = {"fields": FIELDS, "num_fields": len(self.embeddings.lookup), "lstm_num_layers": len(self.lstm.layers)}
+        for prefix, mlp in (("arc_mlp", self.arc_mlp), ("label_mlp", self.label_mlp)):
+            acts = []
+            for k, layer in enumerate(mlp.layers):
+                arrays["{0}_{1}_w".format(prefix, k)] = layer.W.as_array()
+                if isinstance(layer, Dense):
+                    if layer.ln:
+                        raise ValueError("layer normalized MLP cannot be exported")
+                    arrays["{0}_{1}_b".format(prefix, k)] = layer.b.as_array()
+                    acts.append(_ACT_TO_STR[layer.act])
+                else:
+                    acts.append(None)
+            meta[prefix + "_acts"] = acts
+
+        save_arrays(dirname, meta, arrays)
+
     @staticmethod
     def from_spec(spec, model):
         kwargs, = spec
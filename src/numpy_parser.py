@@ -0,0 +1,278 @@
+from __future__ import print_function
+
+import json
+import os
+import numpy as np
+from collections import OrderedDict
+from utils import FIELD_TO_STR, SCORE_DTYPE, DepTree, parse_nonprojective
+
+META_FILENAME = "meta.json"
+
+# VanillaLSTMBuilder pricitava k forget hradlu konstantu (forget_bias=1.0)
+LSTM_FORGET_BIAS = 1.0
+
+def _sigmoid(x):
+    return 1. / (1. + np.exp(-x))
+
+def _relu(x):
+    return np.maximum(x, 0)
+
+_STR_TO_ACT = {"tanh": np.tanh, "sigmoid": _sigmoid, "relu": _relu, None: None}
+
+''' Ulozi polia 'arrays' (meno:np.array) a metadata do adresara, kazde pole do samostatneho .npy suboru '''
+def save_arrays(dirname, meta, arrays):
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    for name, a in arrays.items():
+        np.save(os.path.join(dirname, name + ".npy"), np.ascontiguousarray(a, dtype=SCORE_DTYPE))
+    meta = dict(meta, arrays=list(arrays.keys()))
+    with open(os.path.join(dirname, META_FILENAME), "w") as fp:
+        json.dump(meta, fp, indent=2)
+
+''' Nacita polia ulozene cez 'save_arrays', pri mmap=True ako read-only mapovanie suborov '''
+def load_arrays(dirname, mmap=False):
+    with open(os.path.join(dirname, META_FILENAME), "r") as fp:
+        meta = json.load(fp)
+    mmap_mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(dirname, name + ".npy"), mmap_mode=mmap_mode) for name in meta["arrays"]}
+    return meta, arrays
+
+''' Embeddingova tabulka rozdelena podla frekvencie: create_index prideluje id podla klesajucej frekvencie,
+    prvych 'hot_rows' riadkov sa skopiruje do pamate, zvysok sa cita z mapovaneho suboru cez LRU cache.
+'''
+class TieredEmbeddings(object):
+
+    def __init__(self, table, hot_rows, cache_size=1024):
+        self.hot_rows = min(hot_rows, table.shape[0])
+        self.hot = np.array(table[:self.hot_rows])
+        self.cold = table
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hot_hits = self.cache_hits = self.misses = 0
+
+    @property
+    def shape(self):
+        return self.cold.shape
+
+    def _cold_row(self, i):
+        row = self.cache.pop(i, None)
+        if row is not None:
+            self.cache_hits += 1
+            self.cache[i] = row
+            return row
+        self.misses += 1
+        row = np.array(self.cold[i])
+        if self.cache_size > 0:
+            self.cache[i] = row
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return row
+
+    def __getitem__(self, ids):
+        ids = np.asarray(ids)
+        out = np.empty((len(ids), self.cold.shape[1]), dtype=self.hot.dtype)
+        hot = ids < self.hot_rows
+        out[hot] = self.hot[ids[hot]]
+        self.hot_hits += int(hot.sum())
+        for k in np.flatnonzero(~hot):
+            out[k] = self._cold_row(int(ids[k]))
+        return out
+
+    def stats(self):
+        total = max(self.hot_hits + self.cache_hits + self.misses, 1)
+        return OrderedDict([("rows", self.cold.shape[0]), ("hot_rows", self.hot_rows),
+                            ("resident_bytes", self.hot.nbytes + sum(row.nbytes for row in self.cache.values())),
+                            ("hot_ratio", self.hot_hits / float(total)), ("cache_ratio", self.cache_hits / float(total)),
+                            ("miss_ratio", self.misses / float(total))])
+
+''' Vrati dvojice (pole, statistiky) pre vsetky rozdelene embeddingove tabulky modelu '''
+def embedding_stats(engine):
+    return [(f, table.stats()) for f, table in zip(engine.fields, engine.embeddings) if isinstance(table, TieredEmbeddings)]
+
+def print_embedding_stats(stats, prefix=""):
+    for f, s in stats:
+        print("{0}embeddings {1}: {2}/{3} rows hot, {4:.1f} MB resident, hit ratio hot {5:.2%}, cache {6:.2%}, mmap {7:.2%}".format(
+            prefix, FIELD_TO_STR[f], s["hot_rows"], s["rows"], s["resident_bytes"] / 1024. / 1024., s["hot_ratio"], s["cache_ratio"], s["miss_ratio"]))
+
+class _MLP(object):
+
+    def __init__(self, layers):
+        self.layers = layers
+
+    def pairs(self, HH, HD):
+        # vstup prvej vrstvy je [h_head; h_dep], jej linearna cast sa rozlozi na cast pre hlavy a zavisle
+        (W, b, act), rest = self.layers[0], self.layers[1:]
+        dim = HH.shape[-1]
+        x = np.dot(HH, W[:, :dim].T)[..., :, None, :] + np.dot(HD, W[:, dim:].T)[..., None, :, :]
+        return self._apply(x, b, act, rest)
+
+    def selected(self, HH, HD):
+        (W, b, act), rest = self.layers[0], self.layers[1:]
+        x = np.dot(np.concatenate([HH, HD], axis=-1), W.T)
+        return self._apply(x, b, act, rest)
+
+    @staticmethod
+    def _apply(x, b, act, rest):
+        if b is not None:
+            x += b
+        if act is not None:
+            x = act(x)
+        for W, b, act in rest:
+            x = np.dot(x, W.T)
+            if b is not None:
+                x += b
+            if act is not None:
+                x = act(x)
+        return x
+
+''' Inferencia MLPParser iba pomocou NumPy nad parametrami exportovanymi cez MLPParser.export '''
+class NumpyParser(object):
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        # velkost vsetkych parametrov modelu v bajtoch
+        self.nbytes = sum(a.nbytes for a in arrays.values())
+        self.fields = tuple(meta["fields"])
+        self.embeddings = [arrays["embeddings_{0}".format(i)] for i in range(meta["num_fields"])]
+        self.BOS = arrays["lstm_bos"]
+        self.EOS = arrays["lstm_eos"]
+        self.ROOT = arrays["lstm_root"]
+        self.lstm = [tuple(tuple(arrays["lstm_{0}{1}_{2}".format(l, d, p)] for p in ("wx", "wh", "b")) for d in ("f", "b"))
+                     for l in range(meta["lstm_num_layers"])]
+        self.forget_bias = meta.get("lstm_forget_bias", LSTM_FORGET_BIAS)
+        self.arc_mlp = self._build_mlp(arrays, "arc_mlp", meta["arc_mlp_acts"])
+        self.label_mlp = self._build_mlp(arrays, "label_mlp", meta["label_mlp_acts"])
+
+    @staticmethod
+    def _build_mlp(arrays, prefix, acts):
+        layers = []
+        for k, act in enumerate(acts):
+            b = arrays.get("{0}_{1}_b".format(prefix, k))
+            layers.append((arrays["{0}_{1}_w".format(prefix, k)], b, _STR_TO_ACT[act]))
+        return _MLP(layers)
+
+    ''' Pri hot_rows != None su v pamati iba najcastejsie riadky embeddingov, ostatne sa citaju z mapovaneho suboru '''
+    @staticmethod
+    def load(dirname, mmap=False, hot_rows=None, cache_size=1024):
+        meta, arrays = load_arrays(dirname, mmap or hot_rows is not None)
+        engine = NumpyParser(meta, arrays)
+        if hot_rows is not None:
+            engine.embeddings = [TieredEmbeddings(table, hot_rows, cache_size) for table in engine.embeddings]
+        return engine
+
+    def embed(self, feats):
+        return np.concatenate([table[feats[:, f]] for f, table in enumerate(self.embeddings)], axis=1)
+
+    def _lstm(self, X, params):
+        Wx, Wh, b = params
+        batch_size, max_len, _ = X.shape
+        hidden_dim = Wh.shape[1]
+        XW = np.dot(X, Wx.T) + b
+        h = np.zeros((batch_size, hidden_dim), dtype=X.dtype)
+        c = np.zeros((batch_size, hidden_dim), dtype=X.dtype)
+        out = np.empty((batch_size, max_len, hidden_dim), dtype=X.dtype)
+        for t in range(max_len):
+            gates = XW[:, t] + np.dot(h, Wh.T)
+            i = _sigmoid(gates[:, :hidden_dim])
+            f = _sigmoid(gates[:, hidden_dim:2 * hidden_dim] + self.forget_bias)
+            o = _sigmoid(gates[:, 2 * hidden_dim:3 * hidden_dim])
+            g = np.tanh(gates[:, 3 * hidden_dim:])
+            c = f * c + i * g
+            h = o * np.tanh(c)
+            out[:, t] = h
+        return out
+
+    def transduce(self, feats_list):
+        lengths = np.array([len(feats) + 3 for feats in feats_list])
+        batch_size, max_len = len(feats_list), lengths.max()
+        input_dim = self.BOS.shape[0]
+
+        X = np.zeros((batch_size, max_len, input_dim), dtype=SCORE_DTYPE)
+        for k, feats in enumerate(feats_list):
+            n = len(feats)
+            X[k, 0] = self.BOS
+            X[k, 1] = self.ROOT
+            X[k, 2:n + 2] = self.embed(feats)
+            X[k, n + 2] = self.EOS
+
+        # poradie pre spatny smer: kazda veta otocena v ramci svojej dlzky, vypln ostava na konci
+        positions = np.arange(max_len)
+        reverse = np.where(positions < lengths[:, None], lengths[:, None] - 1 - positions, positions)
+        rows = np.arange(batch_size)[:, None]
+
+        for forward, backward in self.lstm:
+            fs = self._lstm(X, forward)
+            bs = self._lstm(X[rows, reverse], backward)[rows, reverse]
+            X = np.concatenate([fs, bs], axis=2)
+
+        # bez BOS a EOS, pozicia 0 je ROOT
+        return [X[k, 1:length - 1] for k, length in enumerate(lengths)]
+
+    def parse_batch(self, feats_list):
+        h = self.transduce(feats_list)
+        num_nodes = np.array([len(hk) for hk in h])
+        max_nodes = num_nodes.max()
+        H = np.zeros((len(h), max_nodes, h[0].shape[1]), dtype=SCORE_DTYPE)
+        for k, hk in enumerate(h):
+            H[k, :len(hk)] = hk
+
+        arc_scores = self.arc_mlp.pairs(H, H)[..., 0]
+        trees = []
+        for k, n in enumerate(num_nodes):
+            weights = arc_scores[k, :n, :n].copy()
+            weights[:, 0] = 0
+            np.fill_diagonal(weights, 0)
+            tree = DepTree(n - 1)
+            parse_nonprojective(weights, tree.heads)
+            label_scores = self.label_mlp.selected(h[k][tree.heads], h[k][1:])
+            tree.labels[:] = np.argmax(label_scores, axis=1) + 1
+            trees.append(tree)
+        return trees
+
+    def parse(self, feats):
+        return self.parse_batch([feats])[0]
+
+def _compare(model, engine, trees, batch_size):
+    num_tokens = heads_diff = labels_diff = 0
+    for start in range(0, len(trees), batch_size):
+        batch = trees[start:start + batch_size]
+        for tree, parsed in zip(batch, engine.parse_batch([t.feats for t in batch])):
+            expected = model.parse(tree.feats)
+            num_tokens += len(tree)
+            heads_diff += np.sum(expected.heads != parsed.heads)
+            labels_diff += np.sum(expected.labels != parsed.labels)
+    return num_tokens, heads_diff, labels_diff
+
+if __name__ == "__main__":
+    import time
+    from argparse import ArgumentParser
+    import dynet_config
+    dynet_config.set(mem=1024, random_seed=12345)
+    import dynet as dy
+    from models import MLPParser, FIELDS
+    from utils import map_to_instances, read_conllu, read_index
+
+    parser = ArgumentParser()
+    parser.add_argument("--basename", default="../build/en")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--export", required=True)
+    parser.add_argument("--test", default="../treebanks/test/en/en.conllu")
+    parser.add_argument("--batch_size", default=16, type=int)
+    parser.add_argument("--hot_rows", type=int)
+    parser.add_argument("--cache_size", default=1024, type=int)
+    args = parser.parse_args()
+
+    pc = dy.ParameterCollection()
+    model = MLPParser(pc, basename=args.basename)
+    pc.populate(args.model)
+    model.disable_dropout()
+    model.export(args.export)
+
+    start = time.time()
+    engine = NumpyParser.load(args.export, hot_rows=args.hot_rows, cache_size=args.cache_size)
+    print("engine loaded in {0:.1f} ms".format((time.time() - start) * 1000))
+
+    trees = list(map_to_instances(read_conllu(args.test), read_index(args.basename), FIELDS))
+    num_tokens, heads_diff, labels_diff = _compare(model, engine, trees, args.batch_size)
+    print("tokens: {0}, different heads: {1}, different labels: {2}".format(num_tokens, heads_diff, labels_diff))
+    print_embedding_stats(embedding_stats(engine))
@@ -0,0 +1,119 @@
+from __future__ import print_function
+
+import multiprocessing
+import os
+from numpy_parser import NumpyParser, embedding_stats, print_embedding_stats
+
+_ENGINE = None
+_BARRIER = None
+BARRIER_TIMEOUT = 60
+
+def _init_worker(barrier):
+    global _BARRIER
+    _BARRIER = barrier
+
+def _parse_batch(feats_list):
+    return _ENGINE.parse_batch(feats_list)
+
+def _embedding_stats():
+    return embedding_stats(_ENGINE)
+
+# kazdy proces caka na bariere, kym ulohu nedostanu vsetky, takze odpovie kazdy prave raz
+def _on_worker(fn):
+    _BARRIER.wait(BARRIER_TIMEOUT)
+    return os.getpid(), fn()
+
+''' Vrati Rss, Pss a sukromnu pamat procesu 'pid' v kB (zo /proc/<pid>/smaps_rollup) '''
+def process_memory(pid="self"):
+    usage = {"rss": 0, "pss": 0, "private": 0}
+    with open("/proc/{0}/smaps_rollup".format(pid), "r") as fp:
+        for line in fp:
+            key, _, value = line.partition(":")
+            if key == "Rss":
+                usage["rss"] = int(value.split()[0])
+            elif key == "Pss":
+                usage["pss"] = int(value.split()[0])
+            elif key in ("Private_Clean", "Private_Dirty"):
+                usage["private"] += int(value.split()[0])
+    return usage
+
+''' Pool parsovacich procesov nad jednym exportovanym modelom. Rodic model nacita raz
+    (mmap=True ako read-only mapovanie .npy suborov) a procesy vzniknute cez fork
+    zdielaju jeho parametre bez kopirovania.
+'''
+class ParserPool(object):
+
+    def __init__(self, dirname, num_workers, mmap=True, hot_rows=None, cache_size=1024):
+        global _ENGINE
+        _ENGINE = NumpyParser.load(dirname, mmap, hot_rows, cache_size)
+        self.num_workers = num_workers
+        self.mmap = mmap
+        # procesy najdu model iba cez zdedenu globalnu premennu _ENGINE, preto vzdy fork
+        context = multiprocessing.get_context("fork")
+        self.pool = context.Pool(num_workers, initializer=_init_worker, initargs=(context.Barrier(num_workers),))
+
+    def parse(self, feats_list, batch_size=16):
+        batches = [feats_list[i:i + batch_size] for i in range(0, len(feats_list), batch_size)]
+        return [tree for batch in self.pool.imap(_parse_batch, batches) for tree in batch]
+
+    ''' Spusti 'fn' v kazdom procese poolu prave raz, vrati slovnik pid:vysledok '''
+    def on_each_worker(self, fn):
+        return dict(self.pool.map(_on_worker, [fn] * self.num_workers, chunksize=1))
+
+    def memory_report(self):
+        workers = self.on_each_worker(process_memory)
+        parent = process_memory()
+        report = {"parent": parent, "workers": workers}
+        report["total_pss"] = parent["pss"] + sum(w["pss"] for w in workers.values())
+        # samostatne procesy by kazdy mali vlastnu kopiu modelu a k tomu vlastnu sukromnu pamat
+        report["model_kb"] = _ENGINE.nbytes // 1024
+        # bez mmap uz sukromna pamat rodica obsahuje nacitany model
+        parent_private = parent["private"] if self.mmap else max(parent["private"] - report["model_kb"], 0)
+        report["independent_rss"] = (len(workers) + 1) * report["model_kb"] + parent_private + sum(w["private"] for w in workers.values())
+        return report
+
+    ''' Kazdy proces ma vlastnu LRU cache rozdelenych embeddingov, vrati pid:statistiky '''
+    def embedding_report(self):
+        return self.on_each_worker(_embedding_stats)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+def print_memory_report(report):
+    parent = report["parent"]
+    print("parent     rss {0:8d} kB  pss {1:8d} kB  private {2:8d} kB".format(parent["rss"], parent["pss"], parent["private"]))
+    for pid, usage in sorted(report["workers"].items()):
+        print("worker {0:<4} rss {1:8d} kB  pss {2:8d} kB  private {3:8d} kB".format(pid, usage["rss"], usage["pss"], usage["private"]))
+    print("total pss {0} kB, independent processes ~{1} kB (= {2} processes x model {3} kB + private of each process)".format(
+        report["total_pss"], report["independent_rss"], len(report["workers"]) + 1, report["model_kb"]))
+
+if __name__ == "__main__":
+    import time
+    from argparse import ArgumentParser
+    from utils import map_to_instances, read_conllu, read_index
+
+    parser = ArgumentParser()
+    parser.add_argument("--basename", default="../build/en")
+    parser.add_argument("--export", required=True)
+    parser.add_argument("--test", default="../treebanks/test/en/en.conllu")
+    parser.add_argument("--workers", default=multiprocessing.cpu_count(), type=int)
+    parser.add_argument("--batch_size", default=16, type=int)
+    parser.add_argument("--no_mmap", action="store_true")
+    parser.add_argument("--hot_rows", type=int)
+    parser.add_argument("--cache_size", default=1024, type=int)
+    args = parser.parse_args()
+
+    pool = ParserPool(args.export, args.workers, mmap=not args.no_mmap, hot_rows=args.hot_rows, cache_size=args.cache_size)
+    trees = list(map_to_instances(read_conllu(args.test), read_index(args.basename), _ENGINE.fields))
+    feats_list = [tree.feats for tree in trees]
+
+    start = time.time()
+    parsed = pool.parse(feats_list, args.batch_size)
+    elapsed = time.time() - start
+    print("parsed {0} tokens in {1:.2f}s ({2:.1f} tokens/s)".format(sum(len(t) for t in parsed), elapsed,
+          sum(len(t) for t in parsed) / elapsed))
+    print_memory_report(pool.memory_report())
+    for pid, stats in sorted(pool.embedding_report().items()):
+        print_embedding_stats(stats, "worker {0:<4} ".format(pid))
+    pool.close()
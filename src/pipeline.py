@@ -0,0 +1,45 @@
+from __future__ import print_function
+
+import multiprocessing
+from collections import deque
+from utils import decode
+
+def _decode_batch(batch):
+    return [decode(weights, label_scores) for weights, label_scores in batch]
+
+''' Pool procesov pre dekodovanie stromov, vytvara sa raz pre cely beh. Procesy vznikaju
+    cez fork, takze neimportuju znovu hlavny modul (a s nim DyNet).
+'''
+class DecoderPool(object):
+
+    def __init__(self, num_workers):
+        self.num_workers = num_workers
+        self.pool = multiprocessing.get_context("fork").Pool(num_workers)
+
+    ''' Parsuje vety z 'feats_stream' tak, ze hlavny proces pocita skore dalsej davky
+        a procesy poolu medzitym dekoduju stromy z predchadzajucich davok.
+        Stromy vracia v povodnom poradi.
+    '''
+    def parse(self, model, feats_stream, batch_size=8, max_pending=None):
+        if max_pending is None:
+            max_pending = 2 * self.num_workers
+        pending = deque()
+        batch = []
+        for feats in feats_stream:
+            batch.append(model.score(feats))
+            if len(batch) < batch_size:
+                continue
+            pending.append(self.pool.apply_async(_decode_batch, (batch,)))
+            batch = []
+            while pending and (len(pending) >= max_pending or pending[0].ready()):
+                for tree in pending.popleft().get():
+                    yield tree
+        if batch:
+            pending.append(self.pool.apply_async(_decode_batch, (batch,)))
+        while pending:
+            for tree in pending.popleft().get():
+                yield tree
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,182 @@
+from __future__ import print_function
+
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+''' Vrati zoznam konfiguracii zo specifikacie:
+    {"grid": {"lstm_dim": [100, 200], ...}} - vsetky kombinacie,
+    {"random": {"lstm_dim": [100, 200], "input_dropout": {"uniform": [0, 0.5]}}, "trials": 10} - nahodny vyber.
+'''
+def expand_spec(spec, seed=1):
+    if "grid" in spec:
+        grid = OrderedDict(sorted(spec["grid"].items()))
+        return [OrderedDict(zip(grid.keys(), values)) for values in itertools.product(*grid.values())]
+
+    rng = random.Random(seed)
+    def _sample(values):
+        if isinstance(values, dict):
+            lo, hi = values["uniform"]
+            return rng.uniform(lo, hi)
+        return rng.choice(values)
+    space = OrderedDict(sorted(spec["random"].items()))
+    return [OrderedDict((k, _sample(v)) for k, v in space.items()) for _ in range(spec["trials"])]
+
+class Trial(object):
+
+    def __init__(self, trial_id, params, workdir):
+        self.id = trial_id
+        self.params = params
+        self.results_file = os.path.join(workdir, "trial{0}.jsonl".format(trial_id))
+        self.log_file = os.path.join(workdir, "trial{0}.log".format(trial_id))
+        self.process = None
+        self.cpus = None
+        self.status = "pending"
+        self.results = OrderedDict()
+        self.start = self.end = None
+
+    def launch(self, args, cpus, seed):
+        self.cpus = cpus
+        if os.path.exists(self.results_file):
+            os.remove(self.results_file)
+        cmd = [sys.executable, "dl4dp.py", "--model_args", json.dumps(self.params), "--results_log", self.results_file,
+               "--mem", str(args.mem), "--seed", str(seed), "--eval_every", str(args.eval_every),
+               "--max_steps", str(args.max_steps)] + args.dl4dp_args
+        env = dict(os.environ, OMP_NUM_THREADS=str(len(cpus)), MKL_NUM_THREADS=str(len(cpus)))
+        def _pin():
+            if hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, cpus)
+        with open(self.log_file, "w") as log:
+            self.process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env, preexec_fn=_pin)
+        self.status = "running"
+        self.start = time.time()
+
+    def read_results(self):
+        if not os.path.exists(self.results_file):
+            return
+        with open(self.results_file, "r") as fp:
+            for line in fp:
+                r = json.loads(line)
+                self.results[r["step"]] = r
+
+    def best(self):
+        if not self.results:
+            return None
+        return max(self.results.values(), key=lambda r: r["uas"])
+
+    def finish(self, status):
+        self.status = status
+        self.end = time.time()
+
+    def elapsed(self):
+        if self.start is None:
+            return 0.
+        return (self.end or time.time()) - self.start
+
+''' Zastavi pokus, ktoreho najlepsie UAS v poslednom kroku je pod medianom ostatnych pokusov v tom istom kroku '''
+def _should_stop(trial, trials, min_steps, min_trials, margin):
+    if not trial.results:
+        return False
+    step = max(trial.results)
+    if step < min_steps:
+        return False
+    others = sorted(max(r["uas"] for s, r in t.results.items() if s <= step)
+                    for t in trials if t is not trial and step in t.results)
+    if len(others) < min_trials:
+        return False
+    median = others[len(others) // 2] if len(others) % 2 else (others[len(others) // 2 - 1] + others[len(others) // 2]) / 2.
+    return trial.best()["uas"] + margin < median
+
+def run_sweep(trials, args):
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(multiprocessing.cpu_count()))
+    slots = [cpus[i:i + args.cpus_per_trial] for i in range(0, len(cpus) - args.cpus_per_trial + 1, args.cpus_per_trial)]
+    if not slots:
+        sys.exit("--cpus_per_trial {0} exceeds the {1} available cpus".format(args.cpus_per_trial, len(cpus)))
+    if args.parallel > 0:
+        slots = slots[:args.parallel]
+    pending = list(trials)
+    running = []
+
+    while pending or running:
+        while pending and slots:
+            trial = pending.pop(0)
+            trial.launch(args, slots.pop(0), args.seed + trial.id)
+            print("trial {0} started on cpus {1}: {2}".format(trial.id, trial.cpus, json.dumps(trial.params)))
+            running.append(trial)
+
+        time.sleep(args.poll)
+        for trial in list(running):
+            trial.read_results()
+            code = trial.process.poll()
+            if code is not None:
+                trial.finish("done" if code == 0 else "failed({0})".format(code))
+            elif _should_stop(trial, trials, args.min_steps, args.min_trials, args.margin):
+                trial.process.terminate()
+                trial.process.wait()
+                trial.finish("stopped")
+            else:
+                continue
+            trial.read_results()
+            running.remove(trial)
+            slots.append(trial.cpus)
+            best = trial.best()
+            print("trial {0} {1}, best UAS: {2}".format(trial.id, trial.status, "{0:.4f}".format(best["uas"]) if best else "-"))
+
+def write_table(trials, filename):
+    keys = sorted(set(k for t in trials for k in t.params))
+    header = ["trial"] + keys + ["status", "best_step", "uas", "las", "seconds"]
+    rows = []
+    for t in sorted(trials, key=lambda t: -(t.best()["uas"] if t.best() else -1)):
+        best = t.best()
+        rows.append([str(t.id)] + [str(t.params.get(k, "")) for k in keys] + [t.status,
+            str(best["step"]) if best else "-", "{0:.4f}".format(best["uas"]) if best else "-",
+            "{0:.4f}".format(best["las"]) if best else "-", "{0:.0f}".format(t.elapsed())])
+    with open(filename, "w") as fp:
+        for row in [header] + rows:
+            print("\t".join(row), file=fp)
+    for row in [header] + rows:
+        print("\t".join(row))
+
+def _parse_args():
+    parser = ArgumentParser()
+
+    parser.add_argument("--spec", required=True)
+    parser.add_argument("--workdir", default="sweep")
+    parser.add_argument("--output", default="sweep.tsv")
+    parser.add_argument("--cpus_per_trial", default=1, type=int)
+    parser.add_argument("--parallel", default=0, type=int)
+    parser.add_argument("--mem", default="auto")
+    parser.add_argument("--seed", default=12345, type=int)
+    parser.add_argument("--max_steps", default=10000, type=int)
+    parser.add_argument("--eval_every", default=1000, type=int)
+    parser.add_argument("--min_steps", default=2000, type=int)
+    parser.add_argument("--min_trials", default=3, type=int)
+    parser.add_argument("--margin", default=0.0, type=float)
+    parser.add_argument("--poll", default=5.0, type=float)
+    parser.add_argument("dl4dp_args", nargs="*")
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = _parse_args()
+    with open(args.spec, "r") as fp:
+        spec = json.load(fp, object_pairs_hook=OrderedDict)
+    if not os.path.isdir(args.workdir):
+        os.makedirs(args.workdir)
+
+    trials = [Trial(i, params, args.workdir) for i, params in enumerate(expand_spec(spec, args.seed))]
+    print("{0} trials".format(len(trials)))
+    try:
+        run_sweep(trials, args)
+    finally:
+        for trial in trials:
+            if trial.process is not None and trial.process.poll() is None:
+                trial.process.terminate()
+    write_table(trials, args.output)
@@ -0,0 +1,126 @@
+from __future__ import print_function
+
+import json
+import sys
+import time
+from collections import OrderedDict
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+class _Phase(object):
+
+    __slots__ = ("telemetry", "name", "start")
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.telemetry.add_time(self.name, time.time() - self.start)
+        return False
+
+''' Kumulativne casy jednotlivych faz, pocty uzlov vypoctoveho grafu a priepustnost '''
+class Telemetry(object):
+
+    def __init__(self, enabled=True, logfile=None):
+        self.enabled = enabled
+        self.logfile = logfile
+        self._fp = open(logfile, "a") if enabled and logfile else None
+        self.reset()
+
+    def reset(self):
+        self.times = OrderedDict()
+        self.num_sentences = 0
+        self.num_tokens = 0
+        self.num_nodes = 0
+        self.graph_nodes = 0
+        self.start = time.time()
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    ''' DyNet vyhodnocuje graf lenivo, pri zapnutej telemetrii sa graf po 'expr' vypocita
+        este vo vnutri fazy, inak by sa cas vypoctu pripisal az fazi, ktora si vypyta hodnotu
+    '''
+    def sync(self, expr):
+        if self.enabled:
+            expr.forward()
+
+    def add_time(self, name, seconds):
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def count(self, num_tokens, num_sentences=1, num_nodes=0):
+        if not self.enabled:
+            return
+        self.num_tokens += num_tokens
+        self.num_sentences += num_sentences
+        self.num_nodes += num_nodes
+
+    def count_graph(self, num_tokens, expr):
+        if not self.enabled:
+            return
+        num_nodes = graph_size(expr)
+        self.count(num_tokens, 1, num_nodes - self.graph_nodes)
+        self.graph_nodes = num_nodes
+
+    def renew_graph(self):
+        self.graph_nodes = 0
+
+    def summary(self, step=None, label="train"):
+        elapsed = max(time.time() - self.start, 1e-9)
+        summary = OrderedDict()
+        summary["label"] = label
+        if step is not None:
+            summary["step"] = step
+        summary["elapsed"] = elapsed
+        summary["sentences"] = self.num_sentences
+        summary["tokens"] = self.num_tokens
+        summary["sentences_per_sec"] = self.num_sentences / elapsed
+        summary["tokens_per_sec"] = self.num_tokens / elapsed
+        summary["nodes_per_sentence"] = float(self.num_nodes) / max(self.num_sentences, 1)
+        summary["phases"] = OrderedDict(self.times)
+        return summary
+
+    def report(self, step=None, label="train", file=sys.stdout):
+        if not self.enabled:
+            return
+        summary = self.summary(step, label)
+        print(label + " tokens/s: {0:.1f}, sentences/s: {1:.2f}, nodes/sentence: {2:.1f}".format(
+            summary["tokens_per_sec"], summary["sentences_per_sec"], summary["nodes_per_sentence"]), file=file)
+        elapsed = summary["elapsed"]
+        for name, seconds in summary["phases"].items():
+            print("  {0:<14} {1:9.3f}s {2:6.1%}".format(name, seconds, seconds / elapsed), file=file)
+        if self._fp is not None:
+            print(json.dumps(summary), file=self._fp)
+            self._fp.flush()
+        self.reset()
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+NULL_TELEMETRY = Telemetry(enabled=False)
+
+''' Vrati pocet uzlov aktualneho vypoctoveho grafu podla indexu vyrazu 'expr'
+    (DyNet vypisuje vyraz ako "expression <vindex>/<cg_version>")
+'''
+def graph_size(expr):
+    try:
+        return int(str(expr).split()[-1].split("/")[0]) + 1
+    except (ValueError, IndexError):
+        return 0
@@ -5,8 +5,11 @@ import heapq
 import numpy as np
 import re
 import random
+from array import array
 from collections import Counter, OrderedDict, namedtuple, defaultdict
 from functools import total_ordering
+from itertools import chain, islice
+from operator import itemgetter
 
 # Priradenie 0-10
 ID, FORM, LEMMA, UPOS, XPOS, FEATS, HEAD, DEPREL, DEPS, MISC = range(10)
@@ -14,9 +17,15 @@ ID, FORM, LEMMA, UPOS, XPOS, FEATS, HEAD, DEPREL, DEPS, MISC = range(10)
 EMPTY = 0
 MULTIWORD = 1
 
+# Typy poli pre skore a indexy (hlavy, znacky, id tokenov)
+SCORE_DTYPE = np.float32
+INDEX_DTYPE = np.int32
+
 FIELD_TO_STR = ["id", "form", "lemma", "upos", "xpos", "feats", "head", "deprel", "deps", "misc"]
 # Vytvorenie dvojic premenna:id premennej
 STR_TO_FIELD = {k : v for v, k in enumerate(FIELD_TO_STR)}
+# Polia, z ktorych parser vytvara vstupne vektory
+FIELDS = (FORM, UPOS)
 
 ''' Vrati, ci je token prazdny '''
 def isempty(token):
@@ -56,7 +65,8 @@ def normalize_default(field, value):
     value = value.lower()
     return value
 
-def read_conllu(filename, skip_empty=True, skip_multiword=True, parse_feats=False, parse_deps=False, normalize=normalize_default):
+def read_conllu(filename, skip_empty=True, skip_multiword=True, parse_feats=False, parse_deps=False, normalize=normalize_default,
+                offset=0, max_sentences=None):
 
     ''' Vrati pole tokenov bez bielych znakov, odstrani viacslovne tokeny '''
     def _parse_sentence(lines):
@@ -136,8 +146,12 @@ def read_conllu(filename, skip_empty=True, skip_multiword=True, parse_feats=Fals
         return list(map(lambda rel: (int(rel[0]), rel[1]), [rel.split(":") for rel in str.split("|")]))
 
     lines = []
+    num_sentences = 0
     # Citanie zo suboru
     with codecs.open(filename, "r", "utf-8") as fp:
+        # Presun na zaciatok vety na bajtovej pozicii 'offset' (pozri conllu_offsets)
+        if offset:
+            fp.seek(offset)
         for line in fp:
             # Oddeli riadky
             line = line.rstrip("\r\n")
@@ -149,12 +163,115 @@ def read_conllu(filename, skip_empty=True, skip_multiword=True, parse_feats=Fals
                 if len(lines) != 0:
                     yield _parse_sentence(lines)
                     lines = []
+                    num_sentences += 1
+                    if max_sentences is not None and num_sentences >= max_sentences:
+                        return
                 continue
             # Prida do pola riadkov bez komentarov, ...
             lines.append(line)
         if len(lines) != 0:
             yield _parse_sentence(lines)
 
+_INT_FIELDS = (ID, HEAD)
+_INT_NONE = -1
+
+''' Tabulka internovanych retazcov zdielana vetami jedneho korpusu, id 0 je None '''
+class StringPool(object):
+
+    __slots__ = ("ids", "strings")
+
+    def __init__(self):
+        self.ids = {None: 0}
+        self.strings = [None]
+
+    def intern(self, value):
+        i = self.ids.get(value)
+        if i is None:
+            i = len(self.strings)
+            self.ids[value] = i
+            self.strings.append(value)
+        return i
+
+    def __len__(self):
+        return len(self.strings)
+
+''' Pohlad na jeden token kompaktnej vety, podporuje pristup token[FORM] '''
+class CompactToken(object):
+
+    __slots__ = ("sentence", "i")
+
+    def __init__(self, sentence, i):
+        self.sentence = sentence
+        self.i = i
+
+    def __getitem__(self, f):
+        return self.sentence.value(self.i, f)
+
+    def __len__(self):
+        return len(FIELD_TO_STR)
+
+    def __repr__(self):
+        return repr([self[f] for f in range(len(FIELD_TO_STR))])
+
+''' Veta ulozena po stlpcoch v jednom poli 'array' typu int:
+    - ID a HEAD su ulozene priamo, None je -1,
+    - ostatne polia su id do zdielaneho StringPool, None je 0.
+'''
+class CompactSentence(object):
+
+    __slots__ = ("pool", "data", "length")
+
+    def __init__(self, tokens, pool):
+        num_tokens = len(tokens)
+        num_fields = len(FIELD_TO_STR)
+        data = array("i", [0]) * (num_tokens * num_fields)
+        for i, token in enumerate(tokens):
+            for f in range(num_fields):
+                value = token[f]
+                if f in _INT_FIELDS:
+                    if isinstance(value, tuple):
+                        raise ValueError("compact sentences support only integer token ids")
+                    value = _INT_NONE if value is None else value
+                else:
+                    value = pool.intern(value)
+                data[f * num_tokens + i] = value
+        self.pool = pool
+        self.data = data
+        self.length = num_tokens
+
+    def value(self, i, f):
+        v = self.data[f * self.length + i]
+        if f in _INT_FIELDS:
+            return None if v == _INT_NONE else v
+        return self.pool.strings[v]
+
+    def column(self, f):
+        start = f * self.length
+        return self.data[start:start + self.length]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if i < 0 or i >= self.length:
+            raise IndexError(i)
+        return CompactToken(self, i)
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield CompactToken(self, i)
+
+''' Ako read_conllu, ale vrati vety ako CompactSentence so spolocnym StringPool '''
+def read_conllu_compact(filename, pool=None, **kwargs):
+    if kwargs.get("parse_feats") or kwargs.get("parse_deps"):
+        raise ValueError("compact sentences store FEATS and DEPS unparsed")
+    if pool is None:
+        pool = StringPool()
+    for sentence in read_conllu(filename, **kwargs):
+        yield CompactSentence(sentence, pool)
+
 ''' Vrati dvojicu field:Counter, kde pre vsetky sentences spocita, kolko sa v nich jednotlivych fields '''
 def create_dictionary(sentences, fields={FORM, LEMMA, UPOS, XPOS, FEATS, DEPREL}):
     dic = {f: Counter() for f in fields}
@@ -226,14 +343,21 @@ class DepTree(namedtuple("DepTree", "feats, heads, labels")):
 
     def __new__(cls, num_tokens, num_feats=0):
         return super(cls, DepTree).__new__(cls,
-                np.empty((num_tokens, num_feats), dtype=np.int) if num_feats > 0 else None,
-                np.full(num_tokens, -1, dtype=np.int),
-                np.full(num_tokens, -1, dtype=np.int))
+                np.empty((num_tokens, num_feats), dtype=INDEX_DTYPE) if num_feats > 0 else None,
+                np.full(num_tokens, -1, dtype=INDEX_DTYPE),
+                np.full(num_tokens, -1, dtype=INDEX_DTYPE))
 
     ''' Vrati dlzku svojho predka '''
     def __len__(self):
         return len(self.heads)
 
+    def __reduce__(self):
+        return (_deptree_from_arrays, tuple(self))
+
+''' Vytvori DepTree priamo z existujucich poli (bez alokacie) '''
+def _deptree_from_arrays(feats, heads, labels):
+    return tuple.__new__(DepTree, (feats, heads, labels))
+
 ''' Vrati strom vytvoreny zo 'sentence' '''
 def map_to_instance(sentence, index, fields=(FORM, UPOS, FEATS)):
     num_tokens = len(sentence) # dlzka vety
@@ -249,10 +373,58 @@ def map_to_instance(sentence, index, fields=(FORM, UPOS, FEATS)):
 
     return tree
 
-''' Pre kazdu 'sentence' vrati strom '''
-def map_to_instances(sentences, index, fields=(FORM, UPOS, FEATS)):
-    for sentence in sentences:
-        yield map_to_instance(sentence, index, fields)
+''' Vrati hodnoty pola 'f' vsetkych tokenov viet za sebou; pri kompaktnych vetach
+    so spolocnym StringPool su to priamo id retazcov v poole
+'''
+def _column(sentences, f, compact):
+    if compact:
+        return np.concatenate([np.frombuffer(s.column(f), dtype=np.intc) for s in sentences])
+    return list(map(itemgetter(f), chain.from_iterable(sentences)))
+
+''' Zapise do 'out' id hodnot stlpca podla indexu 'ids', kazda unikatna hodnota sa v indexe vyhlada iba raz '''
+def _map_column(values, ids, strings, out):
+    if strings is None:
+        table = {v: ids.get(v, 0) for v in set(values)}
+        out[:] = np.fromiter(map(table.__getitem__, values), dtype=INDEX_DTYPE, count=len(values))
+    else:
+        unique, inverse = np.unique(values, return_inverse=True)
+        table = np.fromiter((ids.get(strings[u], 0) for u in unique), dtype=INDEX_DTYPE, count=len(unique))
+        out[:] = table[inverse]
+
+''' Namapuje vsetky vety naraz do spolocnych poli (feats, heads, labels) a vrati stromy,
+    ktorych polia su pohlady do nich. Kazde pole sa mapuje ako jeden stlpec cez vsetky vety.
+'''
+def map_to_packed(sentences, index, fields=(FORM, UPOS, FEATS)):
+    sentences = sentences if isinstance(sentences, list) else list(sentences)
+    if not sentences:
+        return []
+    offsets = np.zeros(len(sentences) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in sentences], out=offsets[1:])
+    num_tokens = int(offsets[-1])
+    pool = getattr(sentences[0], "pool", None)
+    compact = pool is not None and all(getattr(s, "pool", None) is pool for s in sentences)
+    strings = pool.strings if compact else None
+
+    feats = np.empty((num_tokens, len(fields)), dtype=INDEX_DTYPE)
+    heads = np.empty(num_tokens, dtype=INDEX_DTYPE)
+    labels = np.empty(num_tokens, dtype=INDEX_DTYPE)
+    for j, f in enumerate(fields):
+        _map_column(_column(sentences, f, compact), index[f], strings, feats[:, j])
+    heads[:] = _column(sentences, HEAD, compact)
+    _map_column(_column(sentences, DEPREL, compact), index[DEPREL], strings, labels)
+
+    return [_deptree_from_arrays(feats[start:end], heads[start:end], labels[start:end])
+            for start, end in zip(offsets[:-1], offsets[1:])]
+
+''' Pre kazdu 'sentence' vrati strom, vety sa mapuju po blokoch 'shard_size' cez map_to_packed '''
+def map_to_instances(sentences, index, fields=(FORM, UPOS, FEATS), shard_size=1000):
+    sentences = iter(sentences)
+    while True:
+        shard = list(islice(sentences, shard_size))
+        if not shard:
+            break
+        for tree in map_to_packed(shard, index, fields):
+            yield tree
 
 ''' Vrati nahodne data z 'data' '''
 def shuffled_stream(data):
@@ -261,6 +433,52 @@ def shuffled_stream(data):
         for d in data:
             yield d
 
+''' Vrati bajtove pozicie zaciatkov viet v subore (vratane komentarov pred vetou), kazdu 'step'-tu vetu '''
+def conllu_offsets(filename, step=1):
+    offsets = []
+    num_sentences = 0
+    in_sentence = False
+    position = 0
+    with open(filename, "rb") as fp:
+        for line in fp:
+            if line.strip():
+                if not in_sentence:
+                    if num_sentences % step == 0:
+                        offsets.append(position)
+                    num_sentences += 1
+                    in_sentence = True
+            else:
+                in_sentence = False
+            position += len(line)
+    return offsets
+
+''' Nekonecny prud viet z jedneho alebo viacerych suborov (shardov). Vety sa citaju po blokoch
+    'chunk_size' po sebe iducich viet, poradie blokov sa v kazdej epoche nahodne premiesa.
+'''
+def chunked_stream(filenames, chunk_size=100, **kwargs):
+    if not isinstance(filenames, (list, tuple)):
+        filenames = [filenames]
+    chunks = [(filename, offset) for filename in filenames for offset in conllu_offsets(filename, chunk_size)]
+    while True:
+        random.shuffle(chunks)
+        for filename, offset in chunks:
+            for sentence in read_conllu(filename, offset=offset, max_sentences=chunk_size, **kwargs):
+                yield sentence
+
+''' Premiesa prud 'stream' cez buffer pevnej velkosti 'buffer_size' '''
+def shuffle_buffer(stream, buffer_size):
+    buffer = []
+    for item in stream:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        i = random.randrange(buffer_size)
+        yield buffer[i]
+        buffer[i] = item
+    random.shuffle(buffer)
+    for item in buffer:
+        yield item
+
 def parse_nonprojective(scores, heads=None):
 
     def _push(queue, elm):
@@ -292,12 +510,12 @@ def parse_nonprojective(scores, heads=None):
     roots = list(range(1, nr))
     rset = [0]
 
-    q = np.empty(nr, dtype=np.object)
-    enter = np.empty(nr, dtype=np.object)
+    q = np.empty(nr, dtype=object)
+    enter = np.empty(nr, dtype=object)
 
-    min = np.arange(nr, dtype=np.int)
-    s = np.arange(nr, dtype=np.int)
-    w = np.arange(nr, dtype=np.int)
+    min = np.arange(nr, dtype=INDEX_DTYPE)
+    s = np.arange(nr, dtype=INDEX_DTYPE)
+    w = np.arange(nr, dtype=INDEX_DTYPE)
 
     h = defaultdict(list)
 
@@ -358,14 +576,22 @@ def parse_nonprojective(scores, heads=None):
 
         roots.append(scc_to)
 
-    visited = np.zeros(nr, dtype=np.bool)
+    visited = np.zeros(nr, dtype=np.bool_)
     if heads is None:
-        heads = -np.ones(nr - 1, dtype=np.int)
+        heads = -np.ones(nr - 1, dtype=INDEX_DTYPE)
     for scc in rset:
         _invert_max_branching(min[scc], h, visited, heads)
 
     return heads
 
+''' Zo skore hran 'weights' a skore znaciek pre vsetky dvojice (zavisly, znacka, hlava) vytvori strom '''
+def decode(weights, label_scores):
+    num_tokens = len(weights) - 1
+    tree = DepTree(num_tokens)
+    parse_nonprojective(weights, tree.heads)
+    tree.labels[:] = np.argmax(label_scores[np.arange(num_tokens), :, tree.heads], axis=1) + 1
+    return tree
+
 @total_ordering
 class _Edge(object):
 
@@ -383,17 +609,17 @@ class _Edge(object):
     def __repr__(self):
         return str((self.start, self.end, self.weight))
 
-def parse_projective(scores):
+def parse_projective(scores, dtype=SCORE_DTYPE):
     nr, nc = scores.shape
     N = nr - 1
 
-    complete_0 = np.zeros((nr, nr)) # s, t, direction (right=1).
-    complete_1 = np.zeros((nr, nr)) # s, t, direction (right=1).
-    incomplete_0 = np.zeros((nr, nr)) # s, t, direction (right=1).
-    incomplete_1 = np.zeros((nr, nr)) # s, t, direction (right=1).
+    complete_0 = np.zeros((nr, nr), dtype=dtype) # s, t, direction (right=1).
+    complete_1 = np.zeros((nr, nr), dtype=dtype) # s, t, direction (right=1).
+    incomplete_0 = np.zeros((nr, nr), dtype=dtype) # s, t, direction (right=1).
+    incomplete_1 = np.zeros((nr, nr), dtype=dtype) # s, t, direction (right=1).
 
-    complete_backtrack = -np.ones((nr, nr, 2), dtype=np.int) # s, t, direction (right=1).
-    incomplete_backtrack = -np.ones((nr, nr, 2), dtype=np.int) # s, t, direction (right=1).
+    complete_backtrack = -np.ones((nr, nr, 2), dtype=INDEX_DTYPE) # s, t, direction (right=1).
+    incomplete_backtrack = -np.ones((nr, nr, 2), dtype=INDEX_DTYPE) # s, t, direction (right=1).
 
     for i in range(nr):
         incomplete_0[i, 0] = -np.inf
@@ -435,7 +661,7 @@ def parse_projective(scores):
             complete_1[s, t] = tmp
             complete_backtrack[s, t, 1] = maxidx
 
-    heads = -np.ones(N, dtype=np.int)
+    heads = -np.ones(N, dtype=INDEX_DTYPE)
     _backtrack_eisner(incomplete_backtrack, complete_backtrack, 0, N, 1, 1, heads)
     return heads
 
@@ -1,45 +1,99 @@
 from __future__ import print_function
 
 import codecs
+import multiprocessing
+import os
 import numpy as np
 from argparse import ArgumentParser
-from utils import FORM, UPOS, FEATS, FIELD_TO_STR, STR_TO_FIELD
-from utils import read_conllu, create_dictionary, create_index, write_index, read_index
+from array import array
+from collections import Counter
+from utils import FORM, UPOS, FEATS, FIELD_TO_STR, STR_TO_FIELD, SCORE_DTYPE
+from utils import read_conllu, create_index, create_inverse_index, write_index, read_index
 
 UNKNOWN_TOKEN = u"__unknown__"
 NONE_TOKEN = u"__none__"
 
 VECTORS_FILENAME = "{0}_{1}_vectors.txt"
 
-class _Tokens(object):
-
-    def __init__(self, filename, field, index):
-        self.filename = filename
-        self.field = field
-        self.index = index
- 
-    def __iter__(self):
-
-        def map_token(token):
-            token = token[self.field]
-            if self.index[self.field][token] == 0:
-                token = UNKNOWN_TOKEN
-            elif token is None:
-                token = NONE_TOKEN
-            return token
-
-        for sentence in read_conllu(self.filename):
-            tokens = map(map_token, sentence)
-            yield list(tokens)
-
-def _word2vec(index, args):
-    for i, f in enumerate(args.fields):
-        if args.size[i] > 0:
-            print("building {0}[{1}] vectors...".format(FIELD_TO_STR[f].upper(), args.size[i]), end=" ")
-            tokens = _Tokens(args.inputfile, f, index)
-            model = Word2Vec(tokens, sg=1 if args.sg else 0, size=args.size[i], window=args.window, min_count=1, workers=4, seed=args.seed)
-            model.wv.save_word2vec_format(VECTORS_FILENAME.format(args.outbasename, FIELD_TO_STR[f]))
-            print("done")
+CORPUS_FILENAME = "{0}_{1}_corpus.txt"
+
+''' Precita korpus jedinym prechodom: spocita slovnik poli 'fields' (ako create_dictionary)
+    a vety poli 'corpus_fields' si ulozi ako postupnosti docasnych kodov, ktore sa po vytvoreni
+    indexu premapuju na id z indexu
+'''
+def _read_corpus(filename, fields, corpus_fields):
+    dic = {f: Counter() for f in fields}
+    codes = {f: {} for f in corpus_fields}
+    sentences = {f: [] for f in corpus_fields}
+    for sentence in read_conllu(filename):
+        for f in fields:
+            c = dic[f]
+            for token in sentence:
+                c[token[f]] += 1
+        for f in corpus_fields:
+            code = codes[f]
+            sentences[f].append(array("i", [code.setdefault(token[f], len(code)) for token in sentence]))
+    return dic, (codes, sentences)
+
+''' Pre kazde pole zapise do suboru vety ako postupnosti id z indexu (0 pre nezname tokeny), jedna veta na riadok '''
+def _write_corpora(corpus, index, basename):
+    codes, sentences = corpus
+    for f in sentences:
+        remap = np.zeros(len(codes[f]), dtype=np.int64)
+        for value, code in codes[f].items():
+            remap[code] = index[f].get(value, 0)
+        with open(CORPUS_FILENAME.format(basename, FIELD_TO_STR[f]), "w") as fp:
+            for ids in sentences[f]:
+                print(" ".join(map(str, remap[np.frombuffer(ids, dtype=np.intc)].tolist())), file=fp)
+
+def _vector_token(token_id, inverse_index):
+    if token_id == 0:
+        return UNKNOWN_TOKEN
+    token = inverse_index[token_id]
+    return NONE_TOKEN if token is None else token
+
+def _train_vectors(job):
+    from gensim.models import Word2Vec
+    f, size, corpus_file, inverse_index, args = job
+    model = Word2Vec(corpus_file=corpus_file, sg=1 if args.sg else 0, size=size, window=args.window, min_count=1, workers=args.workers, seed=args.seed)
+    wv = model.wv
+    with codecs.open(VECTORS_FILENAME.format(args.outbasename, FIELD_TO_STR[f]), "w", "utf-8") as fp:
+        print("{0} {1}".format(len(wv.vocab), size), file=fp)
+        for token_id in wv.index2word:
+            vector = " ".join([str(x) for x in wv[token_id]])
+            print(u"{0} {1}".format(_vector_token(int(token_id), inverse_index), vector), file=fp)
+    os.remove(corpus_file)
+    return f
+
+def _vector_fields(args):
+    fields = [f for i, f in enumerate(args.fields) if args.size[i] > 0]
+    sizes = [args.size[i] for i, f in enumerate(args.fields) if args.size[i] > 0]
+    return fields, sizes
+
+def _word2vec(index, corpus, args):
+    fields, sizes = _vector_fields(args)
+
+    print("writing corpora...", end=" ")
+    _write_corpora(corpus, index, args.outbasename)
+    print("done")
+
+    inverse_index = create_inverse_index(index)
+    jobs = [(f, size, CORPUS_FILENAME.format(args.outbasename, FIELD_TO_STR[f]), inverse_index[f], args) for f, size in zip(fields, sizes)]
+    for f, size in zip(fields, sizes):
+        print("building {0}[{1}] vectors...".format(FIELD_TO_STR[f].upper(), size))
+
+    num_processes = min(args.processes, len(jobs)) if args.processes > 0 else len(jobs)
+    if num_processes > 1:
+        pool = multiprocessing.Pool(num_processes)
+        done = pool.imap_unordered(_train_vectors, jobs)
+    else:
+        pool = None
+        done = map(_train_vectors, jobs)
+    for f in done:
+        print("{0} vectors done".format(FIELD_TO_STR[f].upper()))
+    if pool is not None:
+        pool.close()
+        pool.join()
 
 def read_word2vec(basename, fields=(FORM, UPOS, FEATS), index=None):
     if index is None:
@@ -50,7 +104,7 @@ def read_word2vec(basename, fields=(FORM, UPOS, FEATS), index=None):
         with codecs.open(VECTORS_FILENAME.format(basename, FIELD_TO_STR[f]), "r", "utf-8") as fp:
             num_tokens, size = (int(num) for num in fp.readline().split(" "))
             num_tokens = len(index[f]) + 1
-            a = np.zeros((num_tokens, size))
+            a = np.zeros((num_tokens, size), dtype=SCORE_DTYPE)
             for line in fp:
                 line = line.rstrip("\r\n").split(" ")
                 token = line[0]
@@ -72,19 +126,20 @@ def _parse_args():
     parser.add_argument("--window", default=5, type=int)
     parser.add_argument("--sg")
     parser.add_argument("--seed", default=1, type=int)
+    parser.add_argument("--workers", default=4, type=int)
+    parser.add_argument("--processes", default=0, type=int)
 
     args = parser.parse_args()
     args.fields = [STR_TO_FIELD[f.lower()] for f in args.fields]
     return args
 
 if __name__ == "__main__":
-    from gensim.models import Word2Vec
     args = _parse_args()
 
     print("building index...", end=" ")
-    dic = create_dictionary(read_conllu(args.inputfile), fields=args.fields)
+    dic, corpus = _read_corpus(args.inputfile, args.fields, _vector_fields(args)[0])
     index = create_index(dic, min_frequency=args.min_frequency)
     print("done")
     write_index(args.outbasename, index, args.fields)
 
-    _word2vec(index, args)
+    _word2vec(index, corpus, args)